@@ -1,40 +1,115 @@
-import pandas as pd
 import numpy as np
 import numpy.typing as npt
 import os
+from typing import Any, Hashable, Optional
+from _registry import registry
+from _interp import GridInterpolator
+from _modeltable import CORE_PARAMS, ModelTable, fmt, load_model, nearest_index, tensor_current
+from _instrument import timed
+
+MODELDIR  =     "models"
+MODELLIST =    {"nch":        "nch_full_sim",
+                "nch_25":     "nch_25_full_sim",
+                "nch_hvt":    "nch_hvt_full_sim",
+                "nch_lvt":    "nch_lvt_full_sim",
+                "pch":        "pch_full_sim",
+                "pch_25":     "pch_25_full_sim",
+                "pch_hvt":    "pch_hvt_full_sim",
+                "pch_lvt":    "pch_lvt_full_sim"}
+
+# Parameters loaded per model (None = all) and the storage dtype (None = as
+# stored, e.g. "float32"). By default only the parameters the lookups read
+# are loaded; a DataHandler asked for any other parameter reloads the model
+# with it added. Set from ANALOG_MODEL_PARAMS (comma separated, or "all")
+# and ANALOG_MODEL_DTYPE.
+PROJECTION: Optional[list[str]] = (None if os.environ.get("ANALOG_MODEL_PARAMS", "") == "all" else
+                                   os.environ["ANALOG_MODEL_PARAMS"].split(",") if os.environ.get("ANALOG_MODEL_PARAMS")
+                                   else CORE_PARAMS)
+DTYPE: Optional[str] = os.environ.get("ANALOG_MODEL_DTYPE") or None
+
+def model_base(model: str) -> str:
+    return os.path.abspath(os.path.join(MODELDIR, MODELLIST[model]))
+
+def model_exists(model: str) -> bool:
+    base = model_base(model)
+    return tensor_current(base) or os.path.exists(base + ".pkl")
+
+Stamp = tuple[Optional[tuple[int, int]], ...]
+
+def model_stamp(base: str) -> Stamp:
+    # Size and mtime of the model files, changes whenever one is rewritten
+    stamp: list[Optional[tuple[int, int]]] = []
+    for ext in (".pkl", ".npy", ".json"):
+        try:
+            st = os.stat(base + ext)
+            stamp.append((st.st_size, st.st_mtime_ns))
+        except FileNotFoundError:
+            stamp.append(None)
+    return tuple(stamp)
+
+def table_key(base: str, params: Optional[list[str]], dtype: Optional[str], stamp: Optional[Stamp] = None) -> Hashable:
+    # Registry key of a model loaded with a projection and dtype. It holds
+    # the stamp of the files, so a rewritten model is loaded again and
+    # operating points memoized for the old one are not reused.
+    return (base, model_stamp(base) if stamp is None else stamp, None if params is None else tuple(params), dtype)
+
+def discard_stale(base: str, stamp: Stamp) -> None:
+    # Drops the tables (and interpolators) of older versions of the files
+    for key in registry.keys():
+        table = key[0] if isinstance(key, tuple) and len(key) == 2 else key
+        if isinstance(table, tuple) and table[0] == base and table[1] != stamp:
+            registry.discard(key)
 
 class DataHandler:
     def __init__(self) -> None:
-        self.df: pd.DataFrame = pd.DataFrame()
+        self.table: ModelTable = ModelTable(np.empty((0, 0, 0, 0)), [], [], [])
         self.model: str = ""
+        self.base: str = ""
+        self.key: Hashable = ""
+        self.stamp: Stamp = ()
+        self.params: Optional[list[str]] = None
         
+    @timed()
     def load(self, model: str) -> None:
         if self.model == model:
-            return
-        modeldir  =     "models"
-        modellist =    {"nch":        "nch_full_sim",
-                        "nch_25":     "nch_25_full_sim",
-                        "nch_hvt":    "nch_hvt_full_sim",
-                        "nch_lvt":    "nch_lvt_full_sim",
-                        "pch":        "pch_full_sim",
-                        "pch_25":     "pch_25_full_sim",
-                        "pch_hvt":    "pch_hvt_full_sim",
-                        "pch_lvt":    "pch_lvt_full_sim"}
-
-        try:
-            file = os.path.join(modeldir, modellist[model] + ".pkl")
-            self.df = pd.read_pickle(file)
-            self.model = model
-        except:
-            print("Invalid model or model not found: {}".format(model))
-            exit()
+            if self.stamp == model_stamp(self.base):
+                return
+            # The model files changed since they were loaded
+        # Prefers the memory-mapped tensor format (see convert_models.py)
+        # and falls back to the pickled DataFrame. A missing model file
+        # raises FileNotFoundError, the previous model stays loaded.
+        if model not in MODELLIST:
+            raise ValueError("Invalid model: {}".format(model))
+        base = model_base(model)
+        if not model_exists(model):
+            raise FileNotFoundError("Model not found: {} ({}.pkl)".format(model, base))
+        params = None if PROJECTION is None else list(PROJECTION)
+        stamp = model_stamp(base)
+        self.table, self.key = self.__fetch(base, params, stamp)
+        self.base, self.params, self.stamp, self.model = base, params, stamp, model
+            
+    @staticmethod
+    def __fetch(base: str, params: Optional[list[str]], stamp: Stamp) -> tuple[ModelTable, Hashable]:
+        key = table_key(base, params, DTYPE, stamp)
+        discard_stale(base, stamp)
+        return registry.get(key, lambda: load_model(base, params, DTYPE)), key
+            
+    def __getstate__(self) -> dict[str, Any]:
+        # Model data is never pickled (e.g. when a topology is sent to a
+        # worker process). The receiving process loads it again through its
+        # own registry on the next load().
+        return {}
+    
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__() # type: ignore[misc]
             
     def get_loaded(self) -> str:
         return self.model
 
+    @timed()
     def get_axis(self, ax: str, vdsrc: str, gateL: str) -> npt.NDArray[np.float64]:
-        vdsrc = str("{:.2e}".format(float(vdsrc)))
-        gateL = str("{:.2e}".format(float(gateL)))
+        vdsrc = fmt(vdsrc)
+        gateL = fmt(gateL)
         match ax:
             case "gmro":
                 return self.__get_gmro(vdsrc, gateL)
@@ -45,13 +120,32 @@ class DataHandler:
             case _:
                 return self.__get_simple(ax, vdsrc, gateL)
     
+    def interpolator(self) -> GridInterpolator:
+        # Built on first use and shared through the registry like the model
+        return registry.get((self.key, "interp"), lambda: GridInterpolator(self.table))
+    
+    def has_axis(self, ax: str, vdsrc: str, gateL: str) -> bool:
+        return (ax.strip(), fmt(vdsrc), fmt(gateL)) in self.table.index
+    
+    @timed()
+    def nearest(self, ax: str, vdsrc: str, gateL: str, values: npt.ArrayLike) -> npt.NDArray[np.intp]:
+        vdsrc = fmt(vdsrc)
+        gateL = fmt(gateL)
+        sorted_values, order = self.table.sorted(ax, vdsrc, gateL)
+        if len(order) == 0:
+            raise ValueError("No {} data in {} for vdsrc={}, gateL={}".format(ax.strip(), self.model, vdsrc, gateL))
+        return nearest_index(sorted_values, order, np.asarray(values, dtype=np.float64))
+    
     def __get_simple(self, ax: str, vdsrc: str, gateL: str) -> npt.NDArray[np.float64]:
-        # This regex string is a steaming pile of shit, but it essentially ANDs 4 conditions
-        if "pch" in self.model:
-            regex_str: str = "(?=.*M0:{})(?=.*vsd={})(?=.*length={})(?=.*Y)".format(ax, vdsrc, gateL).replace("+", "\\+")
-        else:
-            regex_str: str = "(?=.*M0:{})(?=.*vds={})(?=.*length={})(?=.*Y)".format(ax, vdsrc, gateL).replace("+", "\\+")
-        return self.df.filter(regex=regex_str).to_numpy()
+        # Column names are parsed once at load time, so this is a dict lookup
+        # returning a view into the model table
+        col = self.table.column(ax, vdsrc, gateL)
+        if len(col) == 0 and self.params is not None and ax.strip() not in self.params:
+            # Outside the projection, load the model again with it
+            self.params.append(ax.strip())
+            self.table, self.key = self.__fetch(self.base, self.params, self.stamp)
+            col = self.table.column(ax, vdsrc, gateL)
+        return col
     
     def __get_gmro(self, vdsrc: str, gateL: str) -> npt.NDArray[np.float64]:
         gm:  npt.NDArray[np.float64] = self.__get_simple("gm ", vdsrc, gateL)
@@ -0,0 +1,101 @@
+from typing import Any, Callable, Iterator, Mapping, Optional
+
+# Dependency graphs of the derived quantities of a topology. Every node is a
+# function of a Scope, which resolves names to earlier nodes, devices and
+# topology parameters, in that order. A node returning None does not apply
+# to the design (e.g. second-stage quantities of a single-stage design) and
+# is left out of the results.
+#
+# evaluate() runs every node and works on one design or on arrays of designs
+# (the sweeps). update() recomputes a single design incrementally: the names
+# a node reads are recorded while it runs, and the node is reused as long as
+# none of them changed. A branch on a flag therefore only depends on the
+# devices of the branch taken. Parameters and nodes compare by value,
+# devices by the version their bank gives each resolved operating point.
+
+Node = Callable[["Scope"], Any]
+
+class Scope(Mapping[str, Any]):
+    def __init__(self, p: Mapping[str, Any], M: Mapping[str, Any], computed: Mapping[str, Any],
+                 record: Optional[list[str]] = None) -> None:
+        self.p = p
+        self.M = M
+        self.computed = computed
+        self.record = record
+
+    def __getitem__(self, name: str) -> Any:
+        if self.record is not None:
+            self.record.append(name)
+        if name in self.computed:
+            return self.computed[name]
+        if name in self.M:
+            return self.M[name]
+        return self.p[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter({**self.p, **self.M, **self.computed})
+
+    def __len__(self) -> int:
+        return len({**self.p, **self.M, **self.computed})
+
+class GraphState:
+    # Per-design memo of update()
+    def __init__(self) -> None:
+        # Node value and the names it read
+        self.entries: dict[str, tuple[Any, frozenset[str]]]  = {}
+        # Stamp of every parameter and device read by a node
+        self.inputs: dict[str, Any]                         = {}
+        # Nodes recomputed by the last update
+        self.recomputed: list[str]                          = []
+
+    def clear(self) -> None:
+        self.entries = {}
+        self.inputs = {}
+
+def same(a: Any, b: Any) -> bool:
+    # Equality of stamps, NaN equal to itself
+    return a is b or bool(a == b) or (a != a and b != b)
+
+class Graph:
+    def __init__(self, nodes: dict[str, Node]) -> None:
+        # Nodes only read nodes defined before them
+        self.nodes: dict[str, Node] = nodes
+
+    def evaluate(self, p: Mapping[str, Any], M: Mapping[str, Any]) -> dict[str, Any]:
+        values: dict[str, Any] = {}
+        scope = Scope(p, M, values)
+        for name, fn in self.nodes.items():
+            values[name] = fn(scope)
+        return {name: value for name, value in values.items() if value is not None}
+
+    def update(self, p: Mapping[str, Any], M: Mapping[str, Any], state: GraphState) -> dict[str, Any]:
+        # evaluate() for one design, reusing the nodes of state whose inputs
+        # did not change
+        changed = {name for name, old in state.inputs.items() if not same(self.stamp(name, p, M), old)}
+        values: dict[str, Any] = {}
+        state.recomputed = []
+        for name, fn in self.nodes.items():
+            entry = state.entries.get(name)
+            if entry is not None and changed.isdisjoint(entry[1]):
+                values[name] = entry[0]
+                continue
+            record: list[str] = []
+            values[name] = fn(Scope(p, M, values, record))
+            state.entries[name] = (values[name], frozenset(record))
+            state.recomputed.append(name)
+            if entry is None or not same(values[name], entry[0]):
+                changed.add(name)
+            for dep in record:
+                if dep not in self.nodes and dep not in state.inputs:
+                    state.inputs[dep] = self.stamp(dep, p, M)
+        for name in changed:
+            if name in state.inputs:
+                state.inputs[name] = self.stamp(name, p, M)
+        return {name: value for name, value in values.items() if value is not None}
+
+    def stamp(self, name: str, p: Mapping[str, Any], M: Mapping[str, Any]) -> Any:
+        if name in M:
+            dev = M[name]
+            dev.refresh()
+            return (dev.bank, dev.row, dev.version())
+        return p[name]
@@ -0,0 +1,205 @@
+import atexit
+import cProfile
+import json
+import functools
+import os
+import random
+import sys
+import time
+from array import array
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+# Timing instrumentation of the hot paths (model loads, axis lookups, device
+# and topology recalculation). Methods are marked with @timed, which leaves
+# them untouched, so a disabled run pays nothing. enable() swaps a timing
+# wrapper in on the owning classes and disable() swaps the originals back.
+#
+# Enabled from the environment with
+#   ANALOG_INSTRUMENT=table|json    summary at exit, to stderr or to
+#   ANALOG_INSTRUMENT_FILE=path
+#   ANALOG_PROFILE=path             cProfile the whole run, pstats file at exit
+# or from code with enable(), report() and profile().
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+class Site:
+    def __init__(self, name: str, fn: Callable[..., Any]) -> None:
+        self.name: str                      = name
+        self.fn: Callable[..., Any]         = fn
+        self.wrapper: Callable[..., Any]    = wrap(name, fn)
+
+    def owner(self) -> tuple[Any, str]:
+        # Class and (mangled) attribute name the method is stored under
+        module = sys.modules[self.fn.__module__]
+        *path, attr = self.fn.__qualname__.split(".")
+        owner: Any = module
+        for part in path:
+            owner = getattr(owner, part)
+        if attr.startswith("__") and not attr.endswith("__"):
+            attr = "_" + owner.__name__.lstrip("_") + attr
+        return owner, attr
+
+    def patch(self, on: bool) -> None:
+        owner, attr = self.owner()
+        setattr(owner, attr, self.wrapper if on else self.fn)
+
+# Durations kept per site for the percentiles
+RESERVOIR = 4096
+
+class Timing:
+    # Streaming statistics of the durations [s] of a site: exact count, total,
+    # min and max, and a uniform sample of at most RESERVOIR durations
+    # (reservoir sampling) for the percentiles, so memory stays bounded
+    def __init__(self, size: int = RESERVOIR) -> None:
+        self.size: int                  = size
+        self.count: int                 = 0
+        self.total: float               = 0.0
+        self.min: float                 = float("inf")
+        self.max: float                 = 0.0
+        self.sample: "array[float]"     = array("d")
+        self.__random                   = random.Random(0)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if len(self.sample) < self.size:
+            self.sample.append(value)
+        else:
+            i = int(self.__random.random() * self.count)
+            if i < self.size:
+                self.sample[i] = value
+
+    def reset(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        del self.sample[:]
+        self.__random.seed(0)
+
+# Durations per site name
+timings: dict[str, Timing] = {}
+sites: list[Site] = []
+_enabled = False
+_format = "table"
+_path = ""
+_registered = False
+
+def wrap(name: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+    record = timings.setdefault(name, Timing()).add
+    clock = time.perf_counter
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        start = clock()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            record(clock() - start)
+    return wrapper
+
+def timed(name: Optional[str] = None) -> Callable[[F], F]:
+    # Marks a method for instrumentation, named Class.method by default
+    def decorator(fn: F) -> F:
+        site = Site(name or fn.__qualname__, fn)
+        sites.append(site)
+        # The class does not exist yet, enable() patches it later
+        return site.wrapper if _enabled else fn # type: ignore[return-value]
+    return decorator
+
+def enabled() -> bool:
+    return _enabled
+
+def enable(format: str = "table", path: str = "") -> None:
+    # format is "table" or "json", written to path (stderr if empty) at exit
+    global _enabled, _format, _path, _registered
+    _format = format
+    _path = path
+    if not _registered:
+        atexit.register(_dump)
+        _registered = True
+    if not _enabled:
+        _enabled = True
+        for site in sites:
+            site.patch(True)
+
+def disable() -> None:
+    global _enabled
+    if _enabled:
+        _enabled = False
+        for site in sites:
+            site.patch(False)
+
+def reset() -> None:
+    for timing in timings.values():
+        timing.reset()
+
+def percentile(values: list[float], q: float) -> float:
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def stats() -> dict[str, dict[str, float]]:
+    result = {}
+    for name, timing in timings.items():
+        if not timing.count:
+            continue
+        # Percentiles are estimated from the sample once it is full
+        ordered = sorted(timing.sample)
+        result[name] = {"count":    timing.count,
+                        "total":    timing.total,
+                        "mean":     timing.total / timing.count,
+                        "min":      timing.min,
+                        "p50":      percentile(ordered, 0.50),
+                        "p90":      percentile(ordered, 0.90),
+                        "p99":      percentile(ordered, 0.99),
+                        "max":      timing.max}
+    return result
+
+def report(format: str = "table") -> str:
+    result = stats()
+    if format == "json":
+        return json.dumps(result, indent=4)
+    lines = ["{:<28} {:>10} {:>11} {:>11} {:>11} {:>11} {:>11} {:>11}".format(
+             "Site", "Count", "Total [s]", "Mean [s]", "p50 [s]", "p90 [s]", "p99 [s]", "Max [s]")]
+    for name, entry in sorted(result.items(), key=lambda item: -item[1]["total"]):
+        lines.append("{:<28} {:>10} {:>11.3e} {:>11.3e} {:>11.3e} {:>11.3e} {:>11.3e} {:>11.3e}".format(
+                     name, int(entry["count"]), entry["total"], entry["mean"], entry["p50"], entry["p90"], entry["p99"], entry["max"]))
+    return "\n".join(lines)
+
+def _dump() -> None:
+    if not _enabled or not stats():
+        return
+    text = report(_format)
+    if _path:
+        with open(_path, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text, file=sys.stderr)
+
+@contextmanager
+def profile(path: str) -> Iterator[cProfile.Profile]:
+    # cProfile the block and write pstats to path,
+    # e.g. python -m pstats path
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+if os.environ.get("ANALOG_INSTRUMENT"):
+    enable(os.environ["ANALOG_INSTRUMENT"] if os.environ["ANALOG_INSTRUMENT"] in ("table", "json") else "table",
+           os.environ.get("ANALOG_INSTRUMENT_FILE", ""))
+
+def _dump_profile() -> None:
+    _profiler.disable()
+    _profiler.dump_stats(os.environ["ANALOG_PROFILE"])
+
+if os.environ.get("ANALOG_PROFILE"):
+    _profiler = cProfile.Profile()
+    _profiler.enable()
+    atexit.register(_dump_profile)
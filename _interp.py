@@ -0,0 +1,126 @@
+import numpy as np
+import numpy.typing as npt
+from _modeltable import ModelTable, fmt
+from _instrument import timed
+
+# Trilinear interpolation of gmro, ft and id/W over the (vds, L, gm/id) grid
+# of a model. Each (vds, L) curve is resampled once onto a uniform gm/id grid,
+# so locating a gm/id point is O(1) and locating vds and L is a binary search
+# on short axes. L is interpolated in log space. Queries outside the grid are
+# clamped to its edges. The gm/id range differs between curves (e.g. strong
+# inversion starts at a higher gm/id for short devices), so gm/id is clamped
+# to the range covered by every curve a query interpolates between; the
+# gm/id returned is the clamped one, which the other quantities belong to.
+
+QUANTITIES = ["gmro", "ft", "idw"]
+
+class GridInterpolator:
+    def __init__(self, table: ModelTable, points: int = 1024) -> None:
+        vdsrc   = np.asarray(table.vdsrc, dtype=np.float64)
+        loglen  = np.log(np.asarray(table.lengths, dtype=np.float64))
+        curves: list[list[tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]]] = []
+        lo, hi = np.inf, -np.inf
+        # gm/id range of each curve
+        ranges = np.full((2, len(vdsrc), len(loglen)), np.nan)
+        for i, vds in enumerate(table.vdsrc):
+            row = []
+            for j, L in enumerate(table.lengths):
+                v, l = fmt(vds), fmt(L)
+                gmid = table.column("gmoverid", v, l)
+                if len(gmid) == 0:
+                    row.append((np.empty(0), np.empty((len(QUANTITIES), 0))))
+                    continue
+                gm  = table.column("gm", v, l)
+                gds = table.column("gds", v, l)
+                cgg = table.column("cgg", v, l)
+                id  = table.column("id", v, l)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    values = np.stack([gm / gds, gm / (2 * np.pi * cgg), id / 1e-6])
+                keep = np.isfinite(gmid) & np.all(np.isfinite(values), axis=0)
+                order = np.argsort(gmid[keep], kind="stable")
+                x = gmid[keep][order]
+                row.append((x, values[:, keep][:, order]))
+                if len(x):
+                    lo, hi = min(lo, x[0]), max(hi, x[-1])
+                    ranges[:, i, j] = x[0], x[-1]
+            curves.append(row)
+        if not np.isfinite(lo):
+            raise ValueError("Model has no usable gm/id data")
+        if hi == lo:
+            hi = lo + 1.0
+
+        self.gmoverid = np.linspace(lo, hi, points)
+        # Curves without data are NaN in the tables and do not limit the range
+        ranges[0][np.isnan(ranges[0])] = lo
+        ranges[1][np.isnan(ranges[1])] = hi
+        tables = np.full((len(QUANTITIES), len(vdsrc), len(loglen), points), np.nan)
+        for i, row in enumerate(curves):
+            for j, (x, values) in enumerate(row):
+                if len(x):
+                    for q in range(len(QUANTITIES)):
+                        tables[q, i, j] = np.interp(self.gmoverid, x, values[q])
+
+        # Axes of length one are doubled so every query has two neighbours
+        if len(vdsrc) == 1:
+            vdsrc = np.append(vdsrc, vdsrc[0] + 1.0)
+            tables = np.concatenate([tables, tables], axis=1)
+            ranges = np.concatenate([ranges, ranges], axis=1)
+        if len(loglen) == 1:
+            loglen = np.append(loglen, loglen[0] + 1.0)
+            tables = np.concatenate([tables, tables], axis=2)
+            ranges = np.concatenate([ranges, ranges], axis=2)
+        self.vdsrc: npt.NDArray[np.float64]     = vdsrc
+        self.loglen: npt.NDArray[np.float64]    = loglen
+        self.tables: npt.NDArray[np.float64]    = tables
+        self.ranges: npt.NDArray[np.float64]    = ranges
+        self.nbytes: int                        = int(tables.nbytes + ranges.nbytes)
+
+    @timed()
+    def __call__(self, vdsrc: npt.ArrayLike, gateL: npt.ArrayLike,
+                 gmoverid: npt.ArrayLike) -> dict[str, npt.NDArray[np.float64]]:
+        v, L, g = np.broadcast_arrays(np.asarray(vdsrc, dtype=np.float64),
+                                      np.asarray(gateL, dtype=np.float64),
+                                      np.asarray(gmoverid, dtype=np.float64))
+        iv, tv = self.__locate(self.vdsrc, v)
+        il, tl = self.__locate(self.loglen, np.log(L))
+
+        g = np.clip(g, *self.__limits(iv, tv, il, tl))
+        step = self.gmoverid[1] - self.gmoverid[0]
+        x = (g - self.gmoverid[0]) / step
+        ig = np.minimum(x.astype(np.intp), len(self.gmoverid) - 2)
+        tg = x - ig
+
+        out = np.zeros((len(QUANTITIES),) + g.shape)
+        for dv, wv in ((0, 1 - tv), (1, tv)):
+            for dl, wl in ((0, 1 - tl), (1, tl)):
+                for dg, wg in ((0, 1 - tg), (1, tg)):
+                    out += (wv * wl * wg) * self.tables[:, iv + dv, il + dl, ig + dg]
+
+        result = {"gmoverid": g}
+        for q, name in enumerate(QUANTITIES):
+            result[name] = out[q]
+        return result
+
+    def limits(self, vdsrc: npt.ArrayLike, gateL: npt.ArrayLike) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+        # gm/id range of the queries at (vdsrc, gateL), they are clamped to it
+        v, L = np.broadcast_arrays(np.asarray(vdsrc, dtype=np.float64), np.asarray(gateL, dtype=np.float64))
+        iv, tv = self.__locate(self.vdsrc, v)
+        il, tl = self.__locate(self.loglen, np.log(L))
+        return self.__limits(iv, tv, il, tl)
+
+    def __limits(self, iv: npt.NDArray[np.intp], tv: npt.NDArray[np.float64], il: npt.NDArray[np.intp],
+                 tl: npt.NDArray[np.float64]) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+        # Intersection of the ranges of the curves with a nonzero weight
+        lo = np.full(np.shape(tv), self.gmoverid[0])
+        hi = np.full(np.shape(tv), self.gmoverid[-1])
+        for dv, wv in ((0, 1 - tv), (1, tv)):
+            for dl, wl in ((0, 1 - tl), (1, tl)):
+                used = wv * wl > 0
+                lo = np.where(used, np.maximum(lo, self.ranges[0, iv + dv, il + dl]), lo)
+                hi = np.where(used, np.minimum(hi, self.ranges[1, iv + dv, il + dl]), hi)
+        return lo, hi
+
+    def __locate(self, axis: npt.NDArray[np.float64], x: npt.NDArray[np.float64]) -> tuple[npt.NDArray[np.intp], npt.NDArray[np.float64]]:
+        i = np.clip(np.searchsorted(axis, x, side="right") - 1, 0, len(axis) - 2)
+        t = np.clip((x - axis[i]) / (axis[i + 1] - axis[i]), 0.0, 1.0)
+        return i, t
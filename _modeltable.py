@@ -0,0 +1,224 @@
+import json
+import os
+import re
+import numpy as np
+import numpy.typing as npt
+from typing import Any, Optional
+
+# Column names in the SPICE exports look like
+#   "M0:gm (vds=3.00e-01,length=1.00e-06) Y"
+# i.e. a device parameter, the drain-source (vds) or source-drain (vsd)
+# voltage, the gate length and an X/Y marker. Only Y columns hold data.
+PARAM_RE    = re.compile(r"M0:([^\s(,]+)")
+VDSRC_RE    = re.compile(r"\bv(?:ds|sd)=([^\s,)]+)")
+LENGTH_RE   = re.compile(r"\blength=([^\s,)]+)")
+
+Key = tuple[str, str, str]
+
+# Parameters read by the lookups (get_axis) and the interpolator. Loading
+# only these is enough for all topologies and sweeps.
+CORE_PARAMS = ["gmoverid", "gm", "gds", "id", "cgg"]
+
+def fmt(value: Any) -> str:
+    return str("{:.2e}".format(float(value)))
+
+def parse_column(name: str) -> Optional[Key]:
+    if "Y" not in name:
+        return None
+    param  = PARAM_RE.search(name)
+    vdsrc  = VDSRC_RE.search(name)
+    length = LENGTH_RE.search(name)
+    if param is None or vdsrc is None or length is None:
+        return None
+    try:
+        return (param.group(1), fmt(vdsrc.group(1)), fmt(length.group(1)))
+    except ValueError:
+        return None
+
+class ModelTable:
+    # Dense model data shaped (parameter x vds x L x sweep point). The grid
+    # axes are kept alongside, vds and L sorted ascending. Every lookup is a
+    # contiguous view of the last axis, so a memory-mapped table is never
+    # copied into process memory.
+    def __init__(self, data: npt.NDArray[np.float64], params: list[str], vdsrc: list[float],
+                 lengths: list[float], missing: Optional[list[tuple[int, int, int]]] = None) -> None:
+        self.data: npt.NDArray[np.float64]  = data
+        self.params: list[str]              = params
+        self.vdsrc: list[float]             = vdsrc
+        self.lengths: list[float]           = lengths
+        self.missing: list[tuple[int, int, int]] = missing or []
+
+        skip = set(self.missing)
+        self.index: dict[Key, tuple[int, int, int]] = {}
+        for p, param in enumerate(params):
+            for v, vds in enumerate(vdsrc):
+                for l, L in enumerate(lengths):
+                    if (p, v, l) not in skip:
+                        self.index[(param, fmt(vds), fmt(L))] = (p, v, l)
+
+        # Sort order of each column, built on first use by sorted()
+        self.__sorted: dict[Key, tuple[npt.NDArray[np.float64], npt.NDArray[np.intp]]] = {}
+
+        # Mapped pages live in the shared page cache and can be dropped by
+        # the kernel, so they do not count against the registry budget
+        self.nbytes: int = 0 if isinstance(data, np.memmap) else int(data.nbytes)
+        # Largest relative error introduced by storing the data in a narrower
+        # dtype (see astype)
+        self.rounding: float = 0.0
+
+    @classmethod
+    def from_dataframe(cls, df: Any, params: Optional[list[str]] = None) -> "ModelTable":
+        # Only the given parameters (all if None) are copied out of the frame
+        keys: dict[Key, int] = {}
+        for i, name in enumerate(df.columns):
+            key = parse_column(str(name))
+            if key is not None and key not in keys and (params is None or key[0] in params):
+                keys[key] = i
+
+        params  = list(dict.fromkeys(k[0] for k in keys))
+        vdsrc   = sorted({float(k[1]) for k in keys})
+        lengths = sorted({float(k[2]) for k in keys})
+        p_idx = {p: i for i, p in enumerate(params)}
+        v_idx = {fmt(v): i for i, v in enumerate(vdsrc)}
+        l_idx = {fmt(L): i for i, L in enumerate(lengths)}
+
+        data = np.full((len(params), len(vdsrc), len(lengths), len(df.index)), np.nan)
+        present = np.zeros(data.shape[:3], dtype=bool)
+        for (param, vds, L), col in keys.items():
+            pos = (p_idx[param], v_idx[vds], l_idx[L])
+            data[pos] = df.iloc[:, col].to_numpy(dtype=np.float64)
+            present[pos] = True
+        missing = [(int(p), int(v), int(l)) for p, v, l in np.argwhere(~present)]
+        return cls(data, params, vdsrc, lengths, missing)
+
+    @classmethod
+    def load(cls, base: str, mmap: bool = True) -> "ModelTable":
+        with open(base + ".json") as f:
+            axes = json.load(f)
+        data = np.load(base + ".npy", mmap_mode="r" if mmap else None)
+        missing = [(p, v, l) for p, v, l in axes["missing"]]
+        return cls(data, axes["params"], axes["vdsrc"], axes["lengths"], missing)
+
+    def project(self, params: Optional[list[str]], view: bool = True) -> "ModelTable":
+        # The table restricted to the given parameters (all if None). Data in
+        # memory is copied. With view, a memory-mapped table is sliced to the
+        # contiguous run of parameters covering them instead, which stays
+        # mapped; parameters inside the run that were not asked for come
+        # along, but their pages are never read.
+        if params is None:
+            return self
+        keep = [p for p, name in enumerate(self.params) if name in params]
+        if keep and view and isinstance(self.data, np.memmap):
+            keep = list(range(keep[0], keep[-1] + 1))
+        if len(keep) == len(self.params):
+            return self
+        if keep and keep == list(range(keep[0], keep[-1] + 1)):
+            data = self.data[keep[0]:keep[-1] + 1]
+        else:
+            data = np.asarray(self.data[keep])
+        remap = {p: i for i, p in enumerate(keep)}
+        missing = [(remap[p], v, l) for p, v, l in self.missing if p in remap]
+        table = ModelTable(data, [self.params[p] for p in keep], self.vdsrc, self.lengths, missing)
+        table.rounding = self.rounding
+        return table
+
+    def astype(self, dtype: Any) -> "ModelTable":
+        # Copy stored as dtype, e.g. float32 to halve the memory. The largest
+        # relative error of the conversion is kept in rounding.
+        dtype = np.dtype(dtype)
+        if self.data.dtype == dtype:
+            return self
+        data = np.empty(self.data.shape, dtype=dtype)
+        rounding = self.rounding
+        # One parameter at a time, so the float64 temporaries stay small
+        for p in range(len(self.params)):
+            src = np.asarray(self.data[p], dtype=np.float64)
+            data[p] = src
+            with np.errstate(divide="ignore", invalid="ignore"):
+                err = np.abs(data[p] - src) / np.abs(src)
+            err = err[np.isfinite(err)]
+            if len(err):
+                rounding = max(rounding, float(err.max()))
+        table = ModelTable(data, self.params, self.vdsrc, self.lengths, self.missing)
+        table.rounding = rounding
+        return table
+
+    def save(self, base: str) -> None:
+        np.save(base + ".npy", np.ascontiguousarray(self.data))
+        self.save_axes(base)
+
+    def save_axes(self, base: str) -> None:
+        # The .json half of the tensor format, for data written in place
+        axes = {"params":   self.params,
+                "vdsrc":    self.vdsrc,
+                "lengths":  self.lengths,
+                "missing":  [list(pos) for pos in self.missing]}
+        with open(base + ".json", "w") as f:
+            json.dump(axes, f)
+
+    def column(self, param: str, vdsrc: str, gateL: str) -> npt.NDArray[np.float64]:
+        pos = self.index.get((param.strip(), vdsrc, gateL))
+        if pos is None:
+            return np.empty(0)
+        col: npt.NDArray[np.float64] = self.data[pos]
+        return col
+
+    def sorted(self, param: str, vdsrc: str, gateL: str) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.intp]]:
+        # Finite values of a column in ascending order, and their positions in
+        # the column
+        key = (param.strip(), vdsrc, gateL)
+        entry = self.__sorted.get(key)
+        if entry is None:
+            col = self.column(param, vdsrc, gateL)
+            order = np.flatnonzero(np.isfinite(col))
+            order = order[np.argsort(col[order], kind="stable")]
+            entry = (np.ascontiguousarray(col[order]), order)
+            self.__sorted[key] = entry
+        return entry
+
+def nearest_index(values: npt.NDArray[np.float64], order: npt.NDArray[np.intp],
+                  targets: npt.NDArray[np.float64]) -> npt.NDArray[np.intp]:
+    # Index (into the unsorted column) of the value nearest to each target,
+    # found by binary search on the sorted values
+    if len(values) < 2:
+        return np.full(np.shape(targets), order[0], dtype=np.intp)
+    pos = np.clip(np.searchsorted(values, targets), 1, len(values) - 1)
+    left = values[pos - 1]
+    right = values[pos]
+    pos = pos - ((targets - left) <= (right - targets))
+    result: npt.NDArray[np.intp] = order[pos]
+    return result
+
+def tensor_current(base: str) -> bool:
+    # The tensor files are used when they exist and are not older than the
+    # pickle they were converted from
+    if not (os.path.exists(base + ".npy") and os.path.exists(base + ".json")):
+        return False
+    if not os.path.exists(base + ".pkl"):
+        return True
+    return os.path.getmtime(base + ".npy") >= os.path.getmtime(base + ".pkl")
+
+def load_model(base: str, params: Optional[list[str]] = None, dtype: Optional[str] = None) -> ModelTable:
+    # params projects the table (all if None), dtype narrows the storage
+    # (e.g. "float32", kept as stored if None)
+    if tensor_current(base):
+        table = ModelTable.load(base)
+        # Narrowing copies the data, so only the parameters asked for
+        narrow = dtype is not None and np.dtype(dtype).itemsize < table.data.dtype.itemsize
+        table = table.project(params, view=not narrow)
+    else:
+        # A pickle can only be read whole, so the projection saves memory
+        # once the frame is released but not while loading it
+        import pandas as pd
+        table = ModelTable.from_dataframe(pd.read_pickle(base + ".pkl"), params)
+    if dtype is not None and np.dtype(dtype).itemsize < table.data.dtype.itemsize:
+        table = table.astype(dtype)
+    return table
+
+def convert_model(base: str, params: Optional[list[str]] = None, dtype: Optional[str] = None) -> ModelTable:
+    import pandas as pd
+    table = ModelTable.from_dataframe(pd.read_pickle(base + ".pkl"), params)
+    if dtype is not None:
+        table = table.astype(dtype)
+    table.save(base)
+    return table
@@ -0,0 +1,67 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+# Process-wide memo of resolved operating points. A MosDevice looks up its
+# gm/id, gmro, ft and id/W from (model, L, vdsrc, gm/id, interpolate) only,
+# so devices that share an operating point (the mirror halves of an OTA, or
+# a topology re-evaluated with one knob changed) resolve it once. The number
+# of entries (0 = disabled) is bounded by evicting least recently used ones.
+# The model is keyed by its registry key, which holds the stamp of its files
+# (see _datahandler.table_key), so points of a rewritten model are never
+# reused; they age out of the memo.
+
+Point = tuple[float, float, float, float]
+
+class OperatingPointCache:
+    def __init__(self, size: int = 65536) -> None:
+        self.size: int          = size
+        self.hits: int          = 0
+        self.misses: int        = 0
+        self.evictions: int     = 0
+        self.__lock             = threading.Lock()
+        self.__entries: OrderedDict[Hashable, Point] = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Point]:
+        with self.__lock:
+            point = self.__entries.get(key)
+            if point is None:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return point
+
+    def put(self, key: Hashable, point: Point) -> None:
+        if self.size <= 0:
+            return
+        with self.__lock:
+            self.__entries[key] = point
+            self.__evict()
+
+    def set_size(self, size: int) -> None:
+        with self.__lock:
+            self.size = size
+            self.__evict()
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+
+    def stats(self) -> dict[str, float]:
+        with self.__lock:
+            lookups = self.hits + self.misses
+            return {"hits":         self.hits,
+                    "misses":       self.misses,
+                    "evictions":    self.evictions,
+                    "entries":      len(self.__entries),
+                    "size":         self.size,
+                    "hit_rate":     self.hits / lookups if lookups else 0.0}
+
+    def __evict(self) -> None:
+        while len(self.__entries) > max(self.size, 0):
+            self.__entries.popitem(last=False)
+            self.evictions += 1
+
+opcache = OperatingPointCache(int(os.environ.get("ANALOG_OP_CACHE", "65536")))
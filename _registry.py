@@ -0,0 +1,107 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, TypeVar, cast
+
+# Process-wide cache of loaded model data. Every DataHandler fetches its
+# models through the shared registry below, so a model file is read at most
+# once per process no matter how many MosDevices use it. The memory budget
+# (in bytes, 0 = unlimited) is enforced by evicting least recently used
+# entries. A DataHandler keeps a reference to its current model, so memory
+# of an evicted entry is only returned once no device uses it anymore.
+
+def sizeof(value: Any) -> int:
+    if hasattr(value, "memory_usage"):
+        # pandas DataFrame
+        return int(value.memory_usage(index=True, deep=False).sum())
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    return 0
+
+T = TypeVar("T")
+
+class ModelRegistry:
+    def __init__(self, budget: int = 0) -> None:
+        self.budget: int        = budget
+        self.hits: int          = 0
+        self.misses: int        = 0
+        self.evictions: int     = 0
+        self.nbytes: int        = 0
+        self.__lock             = threading.Lock()
+        self.__entries: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self.__loading: dict[Hashable, threading.Lock]         = {}
+
+    def get(self, key: Hashable, loader: Callable[[], T]) -> T:
+        # Entries are stored untyped, a key always maps to its loader's type
+        with self.__lock:
+            value = self.__lookup(key)
+            if value is not None:
+                return cast(T, value)
+            keylock = self.__loading.setdefault(key, threading.Lock())
+
+        # Only one thread runs the loader for a given key, the others wait
+        # for it and pick up the result as a hit.
+        with keylock:
+            with self.__lock:
+                value = self.__lookup(key)
+                if value is not None:
+                    return cast(T, value)
+                self.misses += 1
+            try:
+                loaded = loader()
+                size = sizeof(loaded)
+                with self.__lock:
+                    self.__entries[key] = (loaded, size)
+                    self.nbytes += size
+                    self.__evict()
+            finally:
+                with self.__lock:
+                    self.__loading.pop(key, None)
+        return loaded
+
+    def set_budget(self, budget: int) -> None:
+        with self.__lock:
+            self.budget = budget
+            self.__evict()
+
+    def discard(self, key: Hashable) -> None:
+        with self.__lock:
+            entry = self.__entries.pop(key, None)
+            if entry is not None:
+                self.nbytes -= entry[1]
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+            self.nbytes = 0
+
+    def keys(self) -> list[Hashable]:
+        with self.__lock:
+            return list(self.__entries.keys())
+
+    def stats(self) -> dict[str, int]:
+        with self.__lock:
+            return {"hits":         self.hits,
+                    "misses":       self.misses,
+                    "evictions":    self.evictions,
+                    "entries":      len(self.__entries),
+                    "nbytes":       self.nbytes,
+                    "budget":       self.budget}
+
+    def __lookup(self, key: Hashable) -> Any:
+        entry = self.__entries.get(key)
+        if entry is None:
+            return None
+        self.__entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def __evict(self) -> None:
+        # The most recently used entry is always kept, even if it alone
+        # exceeds the budget.
+        while self.budget > 0 and self.nbytes > self.budget and len(self.__entries) > 1:
+            _, (_, size) = self.__entries.popitem(last=False)
+            self.nbytes -= size
+            self.evictions += 1
+
+registry = ModelRegistry(int(os.environ.get("ANALOG_MODEL_BUDGET", "0")))
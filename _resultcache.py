@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Mapping, Optional
+
+# Persistent, content-addressed cache of design evaluations (see
+# spec.evaluate). A record is stored under a hash of everything it depends
+# on: the topology and the code evaluating it, the spec (device inputs,
+# currents, capacitors, flags) and the content of the model files it uses.
+# Editing a model file or the equations therefore changes the key, and the
+# stale records are never returned but evicted in time. Records are kept
+# zlib-compressed in SQLite, bounded (in bytes, 0 = unlimited) by evicting
+# least recently used ones. File digests are stored with the size and mtime
+# they were computed for, so a file is only read again after it changed.
+#
+# The store is ANALOG_RESULT_CACHE (empty disables it), its limit
+# ANALOG_RESULT_CACHE_SIZE. Processes and threads may share a store.
+
+# Bump when the records change
+VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, record BLOB NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS results_used ON results (used);
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime INTEGER NOT NULL, digest TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta VALUES ('nbytes', 0);
+"""
+
+def digest_of(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class ResultCache:
+    def __init__(self, path: str, limit: int = 256 << 20) -> None:
+        self.path: str          = path
+        self.limit: int         = limit
+        self.hits: int          = 0
+        self.misses: int        = 0
+        self.evictions: int     = 0
+        # SQLite errors, the cache is skipped instead of failing the design
+        self.errors: int        = 0
+        self.__lock             = threading.Lock()
+        self.__db: Optional[sqlite3.Connection] = None
+        self.__pid: int         = 0
+        self.__files: dict[tuple[str, int, int], str] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.path != ""
+
+    def key(self, parts: Mapping[str, Any]) -> str:
+        # Hash of the canonical JSON of parts
+        text = json.dumps({"version": VERSION, **parts}, sort_keys=True, default=str)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def digest(self, path: str) -> str:
+        # Content hash of a file
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        stamp = (path, st.st_size, st.st_mtime_ns)
+        with self.__lock:
+            digest = self.__files.get(stamp)
+            if digest is not None:
+                return digest
+            try:
+                row = self.__connect().execute("SELECT digest FROM files WHERE path = ? AND size = ? AND mtime = ?",
+                                               stamp).fetchone()
+            except sqlite3.Error:
+                self.errors += 1
+                row = None
+        digest = row[0] if row is not None else digest_of(path)
+        with self.__lock:
+            self.__files[stamp] = digest
+            if row is None:
+                try:
+                    with self.__connect() as db:
+                        db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (*stamp, digest))
+                except sqlite3.Error:
+                    self.errors += 1
+        return digest
+
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        with self.__lock:
+            try:
+                with self.__connect() as db:
+                    row = db.execute("SELECT record FROM results WHERE key = ?", (key,)).fetchone()
+                    if row is not None:
+                        db.execute("UPDATE results SET used = ? WHERE key = ?", (time.time(), key))
+            except sqlite3.Error:
+                self.errors += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        record: dict[str, Any] = json.loads(zlib.decompress(row[0]))
+        return record
+
+    def put(self, key: str, record: Mapping[str, Any]) -> None:
+        blob = zlib.compress(json.dumps(record).encode())
+        with self.__lock:
+            try:
+                with self.__connect() as db:
+                    db.execute("BEGIN IMMEDIATE")
+                    old = db.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+                    db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", (key, blob, len(blob), time.time()))
+                    db.execute("UPDATE meta SET value = value + ? WHERE name = 'nbytes'",
+                               (len(blob) - (old[0] if old is not None else 0),))
+                    self.__evict(db)
+            except sqlite3.Error:
+                self.errors += 1
+
+    def set_limit(self, limit: int) -> None:
+        with self.__lock:
+            self.limit = limit
+            try:
+                with self.__connect() as db:
+                    db.execute("BEGIN IMMEDIATE")
+                    self.__evict(db)
+            except sqlite3.Error:
+                self.errors += 1
+
+    def clear(self) -> None:
+        with self.__lock:
+            try:
+                with self.__connect() as db:
+                    db.execute("BEGIN IMMEDIATE")
+                    db.execute("DELETE FROM results")
+                    db.execute("UPDATE meta SET value = 0 WHERE name = 'nbytes'")
+            except sqlite3.Error:
+                self.errors += 1
+
+    def stats(self) -> dict[str, Any]:
+        with self.__lock:
+            entries, nbytes = 0, 0
+            if self.enabled:
+                try:
+                    db = self.__connect()
+                    entries = db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+                    nbytes = db.execute("SELECT value FROM meta WHERE name = 'nbytes'").fetchone()[0]
+                except sqlite3.Error:
+                    self.errors += 1
+            lookups = self.hits + self.misses
+            return {"path":         self.path,
+                    "hits":         self.hits,
+                    "misses":       self.misses,
+                    "evictions":    self.evictions,
+                    "errors":       self.errors,
+                    "entries":      entries,
+                    "nbytes":       nbytes,
+                    "limit":        self.limit,
+                    "hit_rate":     self.hits / lookups if lookups else 0.0}
+
+    def __connect(self) -> sqlite3.Connection:
+        # One connection per process, shared by its threads under the lock
+        if self.__db is None or self.__pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(SCHEMA)
+            self.__db, self.__pid = db, os.getpid()
+        return self.__db
+
+    def __evict(self, db: sqlite3.Connection) -> None:
+        nbytes = db.execute("SELECT value FROM meta WHERE name = 'nbytes'").fetchone()[0]
+        while self.limit > 0 and nbytes > self.limit:
+            rows = db.execute("SELECT key, size FROM results ORDER BY used LIMIT 64").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if nbytes <= self.limit:
+                    break
+                db.execute("DELETE FROM results WHERE key = ?", (key,))
+                nbytes -= size
+                self.evictions += 1
+        db.execute("UPDATE meta SET value = ? WHERE name = 'nbytes'", (nbytes,))
+
+results = ResultCache(os.environ.get("ANALOG_RESULT_CACHE",
+                                     os.path.join(os.path.expanduser("~"), ".cache", "analog-designer", "results.sqlite")),
+                      int(os.environ.get("ANALOG_RESULT_CACHE_SIZE", str(256 << 20))))
@@ -0,0 +1,100 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Iterator, TextIO
+from _datahandler import MODELLIST, model_exists
+from parallel import SharedModels, attach
+from spec import evaluate, fields, load_specs, models, topology
+
+# Batch evaluation of design specs (see spec.py and designs.toml). Designs
+# are evaluated in a process pool whose workers share the model data (see
+# parallel.py), and each result is written as soon as it is ready, in spec
+# order, as JSON lines or CSV. Designs evaluated before against the same
+# models are read from the result cache (see _resultcache.py).
+#
+#   python batch.py designs.toml -o results.jsonl
+#   python batch.py regression.json --workers 4 --format csv > results.csv
+
+def run(specs: list[dict[str, Any]], workers: int = 0, chunksize: int = 8,
+        cache: bool = True) -> Iterator[dict[str, Any]]:
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(specs) < 2:
+        yield from map(partial(evaluate, cache=cache), specs)
+        return
+    needed: set[str] = set()
+    for spec in specs:
+        try:
+            needed.update(models(spec))
+        except ValueError:
+            # Reported in the spec's record, like missing model files
+            pass
+    shared = SharedModels(model for model in needed & set(MODELLIST) if model_exists(model))
+    try:
+        with ProcessPoolExecutor(min(workers, len(specs)), initializer=attach, initargs=(shared.specs,)) as ex:
+            yield from ex.map(partial(evaluate, cache=cache), specs, chunksize=chunksize)
+    finally:
+        shared.close()
+
+class Writer:
+    def __init__(self, f: TextIO, format: str, columns: list[str]) -> None:
+        self.f = f
+        self.format = format
+        self.csv = csv.DictWriter(f, columns, extrasaction="ignore")
+        if format == "csv":
+            self.csv.writeheader()
+
+    def write(self, record: dict[str, Any]) -> None:
+        if self.format == "csv":
+            self.csv.writerow(record)
+        else:
+            self.f.write(json.dumps(record) + "\n")
+        self.f.flush()
+
+def columns(specs: list[dict[str, Any]]) -> list[str]:
+    # Union of the record fields of all topologies in the batch
+    result = ["name", "topology", "error"]
+    for spec in specs:
+        try:
+            name = topology(spec).__name__
+        except ValueError:
+            continue
+        result += [f for f in fields(name) if f not in result]
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluate a batch of design specs")
+    parser.add_argument("specs", help="JSON or TOML spec file")
+    parser.add_argument("-o", "--output", default="", help="Output file, default stdout")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Default from the output extension, else jsonl")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes, default one per CPU")
+    parser.add_argument("--chunksize", type=int, default=8, help="Designs sent to a worker at a time")
+    parser.add_argument("--no-cache", action="store_true", help="Evaluate every design, ignoring the result cache")
+    args = parser.parse_args()
+
+    specs = load_specs(args.specs)
+    format = args.format or ("csv" if args.output.endswith(".csv") else "jsonl")
+    start = time.perf_counter()
+    failed = 0
+    f = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        writer = Writer(f, format, columns(specs))
+        for record in run(specs, args.workers, args.chunksize, not args.no_cache):
+            if record["error"] is not None:
+                failed += 1
+                print("{}: {}".format(record["name"], record["error"]), file=sys.stderr)
+            writer.write(record)
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    wall = time.perf_counter() - start
+    print("Evaluated {} designs ({} failed) in {:.2f} s".format(len(specs), failed, wall), file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import time
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+from typing import Callable
+import synthetic
+from _modeltable import ModelTable, fmt
+
+# Per-lookup latency of the old regex column filter versus the parsed
+# column index, on a synthetic model table (see synthetic.py).
+
+def regex_lookup(df: pd.DataFrame, ax: str, vdsrc: str, gateL: str) -> npt.NDArray[np.float64]:
+    # The original DataHandler.__get_simple
+    regex_str = "(?=.*M0:{})(?=.*vds={})(?=.*length={})(?=.*Y)".format(ax, vdsrc, gateL).replace("+", "\\+")
+    values: npt.NDArray[np.float64] = df.filter(regex=regex_str).to_numpy()
+    return values
+
+def per_lookup(fn: Callable[[str, str, str], npt.NDArray[np.float64]], queries: list[tuple[str, str, str]], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for q in queries:
+            fn(*q)
+    return (time.perf_counter() - start) / (repeat * len(queries))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vds", type=int, default=10)
+    parser.add_argument("--lengths", type=int, default=20)
+    parser.add_argument("--points", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    vds, lengths, vgs = synthetic.axes(args.vds, args.lengths, args.points)
+    df = synthetic.dataframe("nch", vds, lengths, vgs)
+    rng = np.random.default_rng(0)
+    queries = [(str(rng.choice(["gmoverid", "gm ", "gds", "id ", "cgg "])), fmt(rng.choice(vds)), fmt(rng.choice(lengths)))
+               for _ in range(50)]
+
+    start = time.perf_counter()
+    table = ModelTable.from_dataframe(df)
+    build = time.perf_counter() - start
+
+    before = per_lookup(lambda ax, v, L: regex_lookup(df, ax, v, L), queries, args.repeat)
+    after  = per_lookup(table.column, queries, args.repeat * 1000)
+
+    print("Columns:             {}".format(len(df.columns)))
+    print("Index build:         {:.2e} s (once per load)".format(build))
+    print("Regex filter lookup: {:.2e} s".format(before))
+    print("Column index lookup: {:.2e} s".format(after))
+    print("Speedup:             {:.0f}x".format(before / after))
@@ -0,0 +1,70 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Import-time benchmark. Imports the modules batch workers need in a fresh
+# interpreter with -X importtime and compares the total against the budget
+# tracked in startup_budget.json. Exits non-zero if the budget is exceeded or
+# a plotting/report dependency is imported eagerly.
+#
+#   python bench_startup.py             # check against the budget
+#   python bench_startup.py --update    # write the measured time as budget
+
+BUDGET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_budget.json")
+
+def measure(modules: list[str]) -> tuple[int, dict[str, int]]:
+    # Total microseconds of the top-level imports and cumulative time per
+    # imported module
+    cmd = [sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)]
+    proc = subprocess.run(cmd, capture_output=True, text=True, check=True,
+                          cwd=os.path.dirname(BUDGET))
+    total = 0
+    imported: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        imported[name.strip()] = int(cumulative)
+        # Top-level imports are not indented
+        if name.startswith(" ") and not name.startswith("  "):
+            total += int(cumulative)
+    return total, imported
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check import time against the tracked budget")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs, the fastest one counts")
+    parser.add_argument("--update", action="store_true", help="Write the measured time as the new budget")
+    args = parser.parse_args()
+
+    with open(BUDGET) as f:
+        budget = json.load(f)
+
+    runs = [measure(budget["modules"]) for _ in range(args.repeat)]
+    total, imported = min(runs, key=lambda r: r[0])
+    print("Import time: {:.1f} ms (budget {:.1f} ms)".format(total / 1e3, budget["budget_us"] / 1e3))
+
+    if args.update:
+        # Headroom for machine-to-machine variation
+        budget["budget_us"] = int(total * budget["headroom"])
+        with open(BUDGET, "w") as f:
+            json.dump(budget, f, indent=4)
+            f.write("\n")
+        print("Budget set to {:.1f} ms".format(budget["budget_us"] / 1e3))
+        return
+
+    failed = False
+    for name in budget["forbidden"]:
+        if name in imported:
+            print("FAIL: {} is imported at startup ({:.1f} ms)".format(name, imported[name] / 1e3))
+            failed = True
+    if total > budget["budget_us"]:
+        print("FAIL: import time exceeds the budget by {:.1f} ms".format((total - budget["budget_us"]) / 1e3))
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
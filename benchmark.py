@@ -0,0 +1,166 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+import numpy as np
+from typing import Any, Callable
+import _datahandler
+from _datahandler import DataHandler, MODELLIST
+from _opcache import opcache
+from _registry import registry
+from transistor import MosDevice
+from ota import OTA
+from twostage import TwoStage
+from folded_cascode import FoldedCascode
+from synthetic import write_models
+
+# Benchmark suite. Writes synthetic models (see synthetic.py) of configurable
+# size to a scratch directory and times model loading, axis lookups, device
+# recalculation, topology evaluation and sweep throughput. Results are
+# printed as JSON so runs can be compared across releases.
+#
+#   python benchmark.py --vds 12 --lengths 20 --points 400 --sweep 100000 -o bench.json
+
+def best(fn: Callable[[], Any], number: int, repeat: int) -> float:
+    # Seconds per call, fastest of repeat runs of number calls
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    return min(times)
+
+def bench_load(repeat: int) -> dict[str, Any]:
+    def cold() -> None:
+        registry.clear()
+        for model in MODELLIST:
+            DataHandler().load(model)
+    def warm() -> None:
+        for model in MODELLIST:
+            DataHandler().load(model)
+    return {"cold_seconds": best(cold, 1, repeat) / len(MODELLIST),
+            "warm_seconds": best(warm, 100, repeat) / len(MODELLIST)}
+
+def bench_axes(repeat: int) -> dict[str, Any]:
+    reader = DataHandler()
+    reader.load("nch")
+    rng = np.random.default_rng(0)
+    queries = [(str(rng.choice(reader.table.vdsrc)), str(rng.choice(reader.table.lengths))) for _ in range(100)]
+    results = {}
+    for ax in ("gmro", "id/w", "ft", "gmoverid", "gm ", "cgg "):
+        results[ax.strip()] = best(lambda: [reader.get_axis(ax, v, L) for v, L in queries], 10, repeat) / len(queries)
+    return results
+
+def bench_device(repeat: int) -> dict[str, Any]:
+    reader = DataHandler()
+    reader.load("nch")
+    vdsrc = reader.table.vdsrc[len(reader.table.vdsrc) // 2]
+    gateL = reader.table.lengths[len(reader.table.lengths) // 2]
+    targets = np.linspace(5, 25, 100)
+    results = {}
+    size = opcache.size
+    # Full lookups with the operating point memo off, and memo hits
+    for mode, interpolate, memo in (("nearest", False, 0), ("interpolate", True, 0), ("memoized", False, size)):
+        opcache.set_size(memo)
+        dev = MosDevice().configure(model="nch", gateL=gateL, vdsrc=vdsrc, id=1e-6, gmoverid=10, interpolate=interpolate)
+        def recalculate() -> None:
+            for g in targets:
+                dev.gmoverid = g
+                dev.gmro_val
+        results[mode] = best(recalculate, 10, repeat) / len(targets)
+    opcache.set_size(size)
+    return results
+
+# Device model, L, vdsrc and gm/id of the example configurations
+def ota() -> OTA:
+    ota = OTA()
+    ota.itail, ota.CL, ota.cl_gain = 4.4e-6, 600e-15, 20 * np.log10(22)
+    for name, (model, L, vds, gmid) in {"M0": ("pch_25", 1e-6, 0.3, 27), "M1": ("nch_25", 10e-6, 0.3, 18),
+                                         "M2": ("nch_25", 2e-6, 0.3, 15), "M3": ("pch_25", 6e-6, 0.3, 18),
+                                         "M4": ("pch_25", 2e-6, 0.3, 15)}.items():
+        getattr(ota, name).configure(model=model, gateL=L, vdsrc=vds, gmoverid=gmid)
+    return ota
+
+def twostage() -> TwoStage:
+    ts = TwoStage()
+    ts.itail, ts.iout, ts.CL, ts.Cc, ts.cl_gain = 0.8e-6, 1.8e-6, 500e-15, 150e-15, 20 * np.log10(20)
+    ts.cascode_mirror = ts.cascode_input = True
+    for name, (model, L, vds, gmid) in {"M0": ("pch_25", 1e-6, 0.5, 27), "M1": ("nch_25", 5e-6, 0.3, 23),
+                                         "M2": ("nch", 1e-6, 0.3, 17), "M3": ("nch", 1e-6, 0.6, 20),
+                                         "M4": ("pch_25", 2e-6, 0.6, 20), "M5": ("pch_25", 2e-6, 0.3, 17)}.items():
+        getattr(ts, name).configure(model=model, gateL=L, vdsrc=vds, gmoverid=gmid)
+    return ts
+
+def folded_cascode() -> FoldedCascode:
+    fd = FoldedCascode()
+    fd.itail, fd.iout, fd.CL, fd.Cc, fd.twostage = 3.14e-6, 9.24e-6, 0.5e-12, 0.5e-12, True
+    for name, (model, vds, gmid) in {"M0": ("nch_25", 0.5, 20), "M1": ("pch_25", 0.5, 20), "M2": ("nch_25", 0.3, 17),
+                                     "M3": ("nch", 0.3, 17), "M4": ("pch", 0.3, 17), "M5": ("pch", 0.3, 17),
+                                     "M6": ("nch_25", 0.6, 17), "M7": ("pch_25", 0.6, 20)}.items():
+        getattr(fd, name).configure(model=model, gateL=1e-6, vdsrc=vds, gmoverid=gmid)
+    return fd
+
+def bench_topologies(repeat: int) -> dict[str, Any]:
+    results = {}
+    for name, build in (("OTA", ota), ("TwoStage", twostage), ("FoldedCascode", folded_cascode)):
+        topology = build()
+        def evaluate() -> None:
+            with contextlib.redirect_stdout(io.StringIO()):
+                topology.init()
+                topology.characterize(latex=False)
+        results[name] = best(evaluate, 5, repeat)
+    return results
+
+def bench_sweep(designs: int, repeat: int) -> dict[str, Any]:
+    sweep = twostage().sweep()
+    n = int(np.ceil(np.sqrt(designs)))
+    axes = {"itail": np.linspace(0.5e-6, 5e-6, n), "M0_gmoverid": np.linspace(8, 25, int(np.ceil(designs / n)))}
+    total = n * len(axes["M0_gmoverid"])
+    seconds = best(lambda: sweep.grid(**axes), 1, repeat)
+    return {"designs": total, "seconds": seconds, "designs_per_second": total / seconds}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark on synthetic models")
+    parser.add_argument("--vds", type=int, default=12, help="vds points per model")
+    parser.add_argument("--lengths", type=int, default=20, help="L points per model")
+    parser.add_argument("--points", type=int, default=400, help="Sweep points per column")
+    parser.add_argument("--sweep", type=int, default=100000, help="Designs in the sweep benchmark")
+    parser.add_argument("--format", choices=["npy", "pkl"], default="npy", help="Model file format")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("-o", "--output", default="", help="JSON file, default stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        write_models(directory, args.vds, args.lengths, args.points, args.format)
+        setup = time.perf_counter() - start
+        _datahandler.MODELDIR = directory
+        registry.clear()
+
+        results = {"config":        {"vds": args.vds, "lengths": args.lengths, "points": args.points,
+                                     "format": args.format, "sweep": args.sweep, "repeat": args.repeat},
+                   "environment":   {"python": platform.python_version(), "numpy": np.__version__,
+                                     "machine": platform.machine(), "cpus": os.cpu_count()},
+                   "setup_seconds": setup,
+                   "load":          bench_load(args.repeat),
+                   "get_axis":      bench_axes(args.repeat),
+                   "recalculate":   bench_device(args.repeat),
+                   "characterize":  bench_topologies(args.repeat),
+                   "sweep":         bench_sweep(args.sweep, args.repeat),
+                   "opcache":       opcache.stats()}
+        registry.clear()
+
+    text = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
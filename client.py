@@ -0,0 +1,78 @@
+import itertools
+import json
+import os
+import urllib.error
+import urllib.request
+from typing import Any, Mapping, Optional
+
+# Client of the evaluation server (server.py). Without a running server,
+# or with local=True, calls are evaluated in this process instead, so code
+# using the client works either way.
+#
+#   from client import Client
+#   c = Client()
+#   c.evaluate({"topology": "OTA", "itail": 4.4e-6, ...})
+#   c.lookup(model="nch", gateL=1e-6, vdsrc=0.3, gmoverid=15)
+
+class EvaluationError(Exception):
+    # A call the server (or the local fallback) could not evaluate
+    pass
+
+class Client:
+    def __init__(self, address: str = "", timeout: float = 60.0, local: bool = False) -> None:
+        self.address: str   = address or os.environ.get("ANALOG_SERVER", "127.0.0.1:8765")
+        self.timeout: float = timeout
+        # None until the first call finds out whether a server is running
+        self.remote: Optional[bool] = False if local else None
+        self.__ids = itertools.count(1)
+
+    def call(self, method: str, **params: Any) -> Any:
+        if self.remote is not False:
+            try:
+                result = self.__post(method, params)
+                self.remote = True
+                return result
+            except urllib.error.HTTPError as e:
+                # A server is running but refused the request
+                self.remote = True
+                raise EvaluationError("HTTP {}: {}".format(e.code, e.reason)) from e
+            except TimeoutError as e:
+                # The server accepted the request but did not answer in time
+                self.remote = True
+                raise EvaluationError("No answer from {} within {} s".format(self.address, self.timeout)) from e
+            except (urllib.error.URLError, ConnectionError) as e:
+                if self.remote:
+                    # The server went away after earlier calls
+                    raise EvaluationError("Server at {} unreachable: {}".format(self.address, e)) from e
+                # No server, evaluate in this process from now on
+                self.remote = False
+        from server import dispatch
+        try:
+            return dispatch(method, params)
+        except Exception as e:
+            raise EvaluationError("{}: {}".format(type(e).__name__, e)) from e
+
+    def __post(self, method: str, params: Mapping[str, Any]) -> Any:
+        body = json.dumps({"jsonrpc": "2.0", "id": next(self.__ids), "method": method, "params": params}).encode()
+        request = urllib.request.Request("http://{}/".format(self.address), body, {"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as f:
+            response = json.loads(f.read())
+        if "error" in response:
+            raise EvaluationError(response["error"]["message"])
+        return response["result"]
+
+    def evaluate(self, spec: Mapping[str, Any]) -> dict[str, Any]:
+        result: dict[str, Any] = self.call("evaluate", **spec)
+        return result
+
+    def batch(self, specs: list[Mapping[str, Any]]) -> list[dict[str, Any]]:
+        result: list[dict[str, Any]] = self.call("batch", designs=specs)
+        return result
+
+    def lookup(self, **inputs: Any) -> dict[str, Any]:
+        result: dict[str, Any] = self.call("lookup", **inputs)
+        return result
+
+    def stats(self) -> dict[str, Any]:
+        result: dict[str, Any] = self.call("stats")
+        return result
@@ -0,0 +1,38 @@
+import argparse
+import time
+from _datahandler import MODELLIST, model_base
+from _modeltable import convert_model, tensor_current
+
+# Converts the pickled DataFrame models in models/ to the dense tensor format
+# (<name>.npy + <name>.json), which DataHandler memory-maps instead of
+# unpickling. Workers on the same host then share one page-cache copy.
+#
+# --params keeps only the given parameters (comma separated), --float32
+# stores the data in single precision; the largest relative error this
+# introduces is reported.
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("models", nargs="*", default=list(MODELLIST.keys()))
+    parser.add_argument("--force", action="store_true", help="convert even if the tensor files are up to date")
+    parser.add_argument("--params", default="all", help="parameters to keep, comma separated, or all")
+    parser.add_argument("--float32", action="store_true", help="store in single precision")
+    args = parser.parse_args()
+    params = None if args.params == "all" else args.params.split(",")
+    dtype = "float32" if args.float32 else None
+
+    for model in args.models:
+        base = model_base(model)
+        if tensor_current(base) and not args.force:
+            print("{}: up to date".format(model))
+            continue
+        start = time.perf_counter()
+        try:
+            table = convert_model(base, params, dtype)
+        except FileNotFoundError:
+            print("{}: no model found".format(model))
+            continue
+        print("{}: {} {} ({:.1f} MB) in {:.2f} s".format(model, "x".join(str(n) for n in table.data.shape), table.data.dtype,
+              table.data.nbytes / 1e6, time.perf_counter() - start))
+        if dtype is not None:
+            print("{}: max relative error {:.2e}".format(model, table.rounding))
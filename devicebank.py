@@ -0,0 +1,200 @@
+import numpy as np
+import numpy.typing as npt
+from typing import Any
+from _datahandler import DataHandler
+from _instrument import timed
+from _opcache import opcache
+
+# Struct-of-arrays state of many devices. Every input (model, gm/id, id, L,
+# vdsrc, interpolate) and every resolved metric (gm/id, gmro, ft, id/W,
+# width) is one array with a row per device. A topology keeps the devices of
+# its design in one bank and MosDevice is a view of one row. A bank may also
+# hold the devices of many designs, assigned a column at a time with
+# assign(). The arrays are allocated with spare capacity for add(), rows past
+# len(bank) are unused.
+#
+# resolve() looks up all dirty rows at once, grouped by (model, vdsrc,
+# interpolate), so every group is a single batched lookup.
+
+@timed("devicebank.lookup")
+def lookup(reader: DataHandler, vdsrc: float, interpolate: bool, gmoverid: npt.NDArray[np.float64],
+           gateL: Any) -> tuple[npt.NDArray[np.float64], ...]:
+    # Snaps each gm/id target to the nearest point of the model sweep and
+    # returns gm/id, gmro, ft and id/W at those points. gateL is a single
+    # length unless interpolating, which broadcasts over lengths.
+    if interpolate or not reader.has_axis("gmoverid", str(vdsrc), str(gateL)):
+        res = reader.interpolator()(vdsrc, gateL, gmoverid)
+        return res["gmoverid"], res["gmro"], res["ft"], res["idw"]
+
+    gmoverid_arr = reader.get_axis("gmoverid", str(vdsrc), str(gateL))
+    gmro_arr = reader.get_axis("gmro", str(vdsrc), str(gateL))
+    ft_arr = reader.get_axis("ft", str(vdsrc), str(gateL))
+    idw_arr = reader.get_axis("id/w", str(vdsrc), str(gateL))
+
+    idx = reader.nearest("gmoverid", str(vdsrc), str(gateL), gmoverid)
+    return gmoverid_arr[idx], gmro_arr[idx], ft_arr[idx], idw_arr[idx]
+
+@timed("devicebank.lookup_lengths")
+def lookup_lengths(reader: DataHandler, vdsrc: float, interpolate: bool, gmid: npt.NDArray[np.float64],
+                   length: npt.NDArray[np.float64]) -> tuple[npt.NDArray[np.float64], ...]:
+    # lookup() for per-point lengths
+    lengths, inverse = np.unique(length, return_inverse=True)
+    if len(lengths) == 1:
+        return lookup(reader, vdsrc, interpolate, gmid, float(lengths[0]))
+    if interpolate:
+        return lookup(reader, vdsrc, interpolate, gmid, length)
+    # One search per distinct length of the grid, not per point
+    gmoverid_val, gmro, ft, idw = (np.empty(gmid.shape) for _ in range(4))
+    inverse = inverse.reshape(gmid.shape)
+    for i, L in enumerate(lengths):
+        mask = inverse == i
+        gmoverid_val[mask], gmro[mask], ft[mask], idw[mask] = lookup(reader, vdsrc, interpolate, gmid[mask], float(L))
+    return gmoverid_val, gmro, ft, idw
+
+class DeviceBank:
+    # Arrays of the bank, inputs first
+    INPUTS  = ["model", "gmoverid", "id", "gateL", "vdsrc", "interpolate"]
+    POINT   = ["gmoverid_val", "gmro_val", "ft_val", "idw_val"]
+    ARRAYS  = INPUTS + POINT + ["w_val", "dirty", "deferred", "version"]
+
+    def __init__(self, size: int = 0) -> None:
+        # Rows in use, the first size of them
+        self.rows: int                                  = size
+        # Model names by id, 0 is no model
+        self.models: list[str]                          = [""]
+        self.readers: dict[str, DataHandler]            = {}
+        self.model: npt.NDArray[np.int32]               = np.zeros(size, dtype=np.int32)
+        self.gmoverid: npt.NDArray[np.float64]          = np.zeros(size)
+        self.id: npt.NDArray[np.float64]                = np.zeros(size)
+        self.gateL: npt.NDArray[np.float64]             = np.zeros(size)
+        self.vdsrc: npt.NDArray[np.float64]             = np.zeros(size)
+        self.interpolate: npt.NDArray[np.bool_]         = np.zeros(size, dtype=bool)
+        self.gmoverid_val: npt.NDArray[np.float64]      = np.zeros(size)
+        self.gmro_val: npt.NDArray[np.float64]          = np.zeros(size)
+        self.ft_val: npt.NDArray[np.float64]            = np.zeros(size)
+        self.idw_val: npt.NDArray[np.float64]           = np.zeros(size)
+        self.w_val: npt.NDArray[np.float64]             = np.zeros(size)
+        # Inputs changed since the last resolve
+        self.dirty: npt.NDArray[np.bool_]               = np.zeros(size, dtype=bool)
+        # Nesting depth of MosDevice.batch(), resolve skips deferred rows
+        self.deferred: npt.NDArray[np.int32]            = np.zeros(size, dtype=np.int32)
+        # Incremented every time a row is resolved (see _graph.py)
+        self.version: npt.NDArray[np.int64]             = np.zeros(size, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def add(self) -> int:
+        # Appends an empty row and returns its index. The capacity doubles
+        # when it runs out, so adding n rows copies O(n) elements.
+        if self.rows == len(self.model):
+            capacity = max(8, 2 * self.rows)
+            for name in self.ARRAYS:
+                arr = getattr(self, name)
+                grown = np.zeros(capacity, dtype=arr.dtype)
+                grown[:self.rows] = arr[:self.rows]
+                setattr(self, name, grown)
+        self.rows += 1
+        return self.rows - 1
+
+    def model_id(self, model: str) -> int:
+        if model not in self.models:
+            self.models.append(model)
+        return self.models.index(model)
+
+    def reader(self, model: str) -> DataHandler:
+        reader = self.readers.get(model)
+        if reader is None:
+            reader = self.readers[model] = DataHandler()
+        reader.load(model)
+        return reader
+
+    def set(self, row: int, name: str, value: Any) -> None:
+        # Assigns one input, marking the row dirty if it changed
+        arr = getattr(self, name)
+        if name == "model":
+            value = self.model_id(value)
+        if arr[row] != value:
+            arr[row] = value
+            self.dirty[row] = True
+
+    def assign(self, name: str, values: npt.ArrayLike, rows: Any = slice(None)) -> None:
+        # Vectorized set() of one input for many rows
+        arr = getattr(self, name)[:len(self)]
+        if name == "model":
+            values = np.array([self.model_id(m) for m in np.ravel(np.asarray(values, dtype=object))]).reshape(np.shape(values))
+        new = np.broadcast_to(np.asarray(values, dtype=arr.dtype), arr[rows].shape)
+        changed = np.zeros(len(self), dtype=bool)
+        changed[rows] = arr[rows] != new
+        arr[rows] = new
+        self.dirty[:len(self)] |= changed
+
+    def valid(self, rows: Any = None) -> npt.NDArray[np.bool_]:
+        # Whether the rows (all if None) have every input set
+        if rows is None:
+            rows = slice(0, len(self))
+        valid: npt.NDArray[np.bool_] = ((self.model[rows] != 0) & (self.gmoverid[rows] != 0.0) & (self.id[rows] != 0.0)
+                                        & (self.gateL[rows] != 0.0) & (self.vdsrc[rows] != 0.0))
+        return valid
+
+    @timed()
+    def resolve(self) -> None:
+        # Looks up the operating points of the dirty, complete rows that are
+        # not deferred. Operating points are shared through the process-wide
+        # memo (see _opcache.py); the others are resolved with one batched
+        # lookup per (model, vdsrc, interpolate).
+        idx = [row for row in self.dirty.nonzero()[0].tolist() if self.deferred[row] == 0 and self.valid(row)]
+        if not idx:
+            return
+
+        # Every model of the bank is loaded (or checked for changes) once per
+        # resolve. If its files changed since the rows were resolved, every
+        # row of the model is looked up again, not only the dirty ones, so
+        # the devices never mix points of the old and the new model.
+        readers: dict[str, DataHandler] = {}
+        used = set(self.model[:len(self)].tolist())
+        ids = {int(self.model[row]) for row in idx} | {self.models.index(m) for m in self.readers} & used
+        for model_id in sorted(ids):
+            model = self.models[model_id]
+            stamp = self.readers[model].stamp if model in self.readers else None
+            readers[model] = self.reader(model)
+            if readers[model].stamp != stamp:
+                self.dirty[:len(self)] |= self.model[:len(self)] == model_id
+        idx = [row for row in self.dirty.nonzero()[0].tolist() if self.deferred[row] == 0 and self.valid(row)]
+
+        keys: dict[int, Any] = {}
+        groups: dict[tuple[str, float, bool], list[int]] = {}
+        for row in idx:
+            model = self.models[self.model[row]]
+            vdsrc, interpolate = float(self.vdsrc[row]), bool(self.interpolate[row])
+            key = (readers[model].key, float(self.gateL[row]), vdsrc, float(self.gmoverid[row]), interpolate)
+            point = opcache.get(key)
+            if point is None:
+                keys[row] = key
+                groups.setdefault((model, vdsrc, interpolate), []).append(row)
+            else:
+                self.__store(row, point)
+
+        for (model, vdsrc, interpolate), members in groups.items():
+            reader = readers[model]
+            if len(members) == 1:
+                # A scalar lookup indexes the tables instead of gathering
+                row = members[0]
+                points = lookup(reader, vdsrc, interpolate, np.asarray(self.gmoverid[row]), float(self.gateL[row]))
+            else:
+                group = np.array(members)
+                points = lookup_lengths(reader, vdsrc, interpolate, self.gmoverid[group], self.gateL[group])
+            values = [np.ravel(v) for v in points]
+            for i, row in enumerate(members):
+                gmoverid, gmro, ft, idw = (float(v[i]) for v in values)
+                point = (gmoverid, gmro, ft, idw)
+                opcache.put(keys[row], point)
+                self.__store(row, point)
+
+        for row in idx:
+            self.w_val[row] = self.id[row] / self.idw_val[row]
+            self.dirty[row] = False
+            self.version[row] += 1
+
+    def __store(self, row: int, point: tuple[float, float, float, float]) -> None:
+        self.gmoverid_val[row], self.gmro_val[row], self.ft_val[row], self.idw_val[row] = point
@@ -1,34 +1,47 @@
 import numpy as np
-import scipy as sp
-import matplotlib.pyplot as plt
-from tabulate import tabulate
 from utils import Utils
 from transistor import MosDevice
+from devicebank import DeviceBank
+from sweep import Sweep
+from sensitivity import STEP, Jacobian, jacobian
+import freqresp
+from stability import metrics as stability_metrics
+from typing import Any, Mapping
+from _instrument import timed
+from _graph import Graph, GraphState
+
+utils = Utils()
 
 # Full input-swing folded cascode
 # P. 390 Razavi
 
 class FoldedCascode:
+    DEVICES = ["M0", "M1", "M2", "M3", "M4", "M5", "M6", "M7"]
+    # Attributes set by __calculate
+    STATE   = ["gm_1st", "rout_1st", "gm_2nd", "rout_2nd", "av_1st", "av_2nd", "fp1", "fp2", "fp3", "fp4"]
+    
     def __init__(self) -> None:
         self.utils = Utils()
+        # Inputs and operating points of all devices (see devicebank.py)
+        self.bank = DeviceBank()
         # Closed loop gain
         self.cl_gain: float = 0.0
         # input NMOS
-        self.M0 = MosDevice()
+        self.M0 = MosDevice(self.bank)
         # input PMOS
-        self.M1 = MosDevice()
+        self.M1 = MosDevice(self.bank)
         # NMOS Mirror
-        self.M2 = MosDevice()
+        self.M2 = MosDevice(self.bank)
         # NMOS Mirror Cascode
-        self.M3 = MosDevice()
+        self.M3 = MosDevice(self.bank)
         # PMOS CCS
-        self.M4 = MosDevice()
+        self.M4 = MosDevice(self.bank)
         # PMOS CCS Cascode
-        self.M5 = MosDevice()
+        self.M5 = MosDevice(self.bank)
         # 2nd stage NMOS
-        self.M6 = MosDevice()
+        self.M6 = MosDevice(self.bank)
         # 2nd stage PMOS
-        self.M7 = MosDevice()
+        self.M7 = MosDevice(self.bank)
         # Miller capacitor
         self.Cc:float           = 0.0
         # Output stage currnet
@@ -55,41 +68,64 @@ class FoldedCascode:
         self.fp2: float     = 0.0
         # 1st stage mirror pole
         self.fp3: float     = 0.0
+        # Cascode pole
+        self.fp4: float     = 0.0
 
         self.twostage: bool = False
         
+        # Derived quantities of the last init()
+        self.graph = GraphState()
+        
+    @timed()
     def init(self) -> None:
-        self.M0.set_id(self.itail/2)
-        self.M1.set_id(self.itail/2)
-        self.M2.set_id(self.itail)
-        self.M3.set_id(self.itail/2)
-        self.M4.set_id(self.itail)
-        self.M5.set_id(self.itail/2)
-        if self.twostage:
-            self.M6.set_id(self.iout)
-            self.M7.set_id(self.iout)
+        for name, id in self.currents(vars(self)).items():
+            getattr(self, name).set_id(id)
+        # All devices in one go, a batched lookup per model
+        self.bank.resolve()
 
         self.__calculate()
             
+    @timed()
     def __calculate(self) -> None:
-        # Assume worst case GM
-        self.gm_1st = min(self.M0.gm(), self.M1.gm())
-        pmos_ro_1st = self.utils.cascode(self.M4.ro(), self.M5.ro(), self.M5.gm())
-        nmos_ro_1st = self.utils.cascode(self.M2.ro(), self.M3.ro(), self.M3.gm())
-        self.rout_1st = self.utils.parallel([pmos_ro_1st, nmos_ro_1st])
-        self.av_1st = self.rout_1st * self.gm_1st
-
-        if self.twostage:
-            self.gm_2nd   = self.M6.gm()
-            self.rout_2nd = self.utils.parallel([self.M6.ro(), self.M7.ro()])
-            self.av_2nd   = self.rout_2nd * self.gm_2nd
-            self.fp1 = (1 / (2 * np.pi * self.Cc * (1 + self.av_2nd) * self.rout_1st))
-            self.fp2 = (self.M6.gm() / (2 * np.pi * self.CL))
-            self.fp3 = (self.M2.gm() / (2 * np.pi * self.M2.cgs()))
-            self.fp4 = (self.M3.gm() / (2 * np.pi * 3 * self.M1.cgs()))
-        else:
-            self.fp1 = 1 / (2 * np.pi * self.rout_1st * self.CL)
-            self.fp2 = self.M2.gm() / (2 * np.pi * self.M2.cgs())
+        # Only the quantities whose inputs changed since the last call are
+        # recomputed (see _graph.py)
+        out = GRAPH.update(vars(self), {name: getattr(self, name) for name in self.DEVICES}, self.graph)
+        for name in self.STATE:
+            if name in out:
+                setattr(self, name, out[name])
+        
+    # Like TwoStage, the equations work on a single design or on arrays of
+    # designs (see FoldedCascodeSweep)
+    @staticmethod
+    def currents(p: Mapping[str, Any]) -> dict[str, Any]:
+        currents = {"M0": p["itail"]/2,
+                    "M1": p["itail"]/2,
+                    "M2": p["itail"],
+                    "M3": p["itail"]/2,
+                    "M4": p["itail"],
+                    "M5": p["itail"]/2}
+        if p["twostage"]:
+            currents["M6"] = p["iout"]
+            currents["M7"] = p["iout"]
+        return currents
+    
+    @staticmethod
+    def equations(p: Mapping[str, Any], M: Mapping[str, Any]) -> dict[str, Any]:
+        return GRAPH.evaluate(p, M)
+    
+    @staticmethod
+    def consumption(p: Mapping[str, Any]) -> Any:
+        return (p["itail"] * 4) * 1.2 # Assuming 1.2 VDD
+    
+    def sweep(self) -> "FoldedCascodeSweep":
+        # Vectorized evaluation of many designs based on this one
+        return FoldedCascodeSweep(self)
+        
+    def sensitivity(self, knobs: list[str] | None = None, outputs: list[str] | None = None,
+                    step: float = STEP) -> Jacobian:
+        # Derivatives of the metrics with respect to the sizing knobs, from
+        # one batched evaluation (see sensitivity.py)
+        return jacobian(self, knobs, outputs, step)
         
     def av(self) -> float:
         if self.twostage:
@@ -97,6 +133,20 @@ class FoldedCascode:
         else:
             return self.av_1st
     
+    def power(self) -> float:
+        result: float = self.consumption(vars(self))
+        return result
+    
+    def area(self) -> float:
+        # Gate area of all devices in use
+        return self.utils.area([getattr(self, name) for name in self.currents(vars(self))])
+    
+    def stability(self) -> dict[str, float]:
+        # Unity-gain frequency, GBW and phase margin at cl_gain, computed from
+        # the poles without a bode plot
+        res = stability_metrics(self.poles(), self.av(), self.cl_gain)
+        return {name: float(value[0]) for name, value in res.items()}
+    
     def rout(self) -> float:
         if self.twostage:
             return self.rout_2nd
@@ -124,10 +174,11 @@ class FoldedCascode:
             return {"W0": W0, "W1": W1, "W2": W2, "W3": W3, "W4": W4, "W5": W5}
     
     def characterize(self, latex: bool) -> None:
+        from tabulate import tabulate
         av   = np.round(20*np.log10(self.av()), 2)
         poles = self.poles()
         sizes = self.size()
-        power = (self.itail * 4) * 1.2 # Assuming 1.2 VDD
+        power = self.power()
         
         poles_formatted = []
         for pole in poles:
@@ -160,36 +211,35 @@ class FoldedCascode:
         print("Power Consumption: {:.2e} W".format(power))
         
     def bode(self) -> None:
-        if not self.twostage:
-            return
-        poles = self.poles()
-        p1 = poles[0]
-        p2 = poles[1]
-        p3 = poles[2]
-        den3 = [1, p1+p2+p3, p1*p2+p3*p1+p2*p3, p1*p2*p3]
-        K = den3[-1] * self.av()
-        
-        w = np.logspace(1, 9, 1000)
-        sys = sp.signal.TransferFunction([K], den3)
-        w, mag, phase = sp.signal.bode(sys, w)
-
-        fig, ax = plt.subplots()
-        fig.set_size_inches(12, 8)
-
-        ax.set_xlabel('Frequency [Hz]')
-        ax.set_ylabel('Magnitude [dB]')
-        ax.semilogx(w, mag)
-
-        ax2 = ax.twinx()
-        ax2.semilogx(w, phase, color="red")
-        ax2.set_ylabel('Phase [deg]')
-        ax.grid()
+        f = freqresp.frequencies(1e1, 1e9)
+        mag, phase = freqresp.response(self.poles(), self.av(), f)
+        print("Phase Margin: {}".format(self.stability()["phase_margin"]))
+        self.utils.plot_bode(f, mag[0], phase[0])
 
-        for i in range(0, len(mag)):
-            if mag[i] < self.cl_gain:
-                print("Phase Margin: {}".format(180+phase[i]))
-                break
+# Derived quantities of a FoldedCascode and what they depend on (see
+# _graph.py). Second stage quantities are None for a single-stage design.
+GRAPH = Graph({# Assume worst case GM
+               "gm_1st":        lambda v: np.minimum(v["M0"].gm(), v["M1"].gm()),
+               "pmos_ro_1st":   lambda v: utils.cascode(v["M4"].ro(), v["M5"].ro(), v["M5"].gm()),
+               "nmos_ro_1st":   lambda v: utils.cascode(v["M2"].ro(), v["M3"].ro(), v["M3"].gm()),
+               "rout_1st":      lambda v: utils.parallel([v["pmos_ro_1st"], v["nmos_ro_1st"]]),
+               "av_1st":        lambda v: v["rout_1st"] * v["gm_1st"],
+               "power":         lambda v: FoldedCascode.consumption(v),
+               "gm_2nd":        lambda v: v["M6"].gm() if v["twostage"] else None,
+               "rout_2nd":      lambda v: utils.parallel([v["M6"].ro(), v["M7"].ro()]) if v["twostage"] else None,
+               "av_2nd":        lambda v: v["rout_2nd"] * v["gm_2nd"] if v["twostage"] else None,
+               "fp1":           lambda v: ((1 / (2 * np.pi * v["Cc"] * (1 + v["av_2nd"]) * v["rout_1st"])) if v["twostage"]
+                                           else 1 / (2 * np.pi * v["rout_1st"] * v["CL"])),
+               "fp2":           lambda v: ((v["M6"].gm() / (2 * np.pi * v["CL"])) if v["twostage"]
+                                           else v["M2"].gm() / (2 * np.pi * v["M2"].cgs())),
+               "fp3":           lambda v: (v["M2"].gm() / (2 * np.pi * v["M2"].cgs())) if v["twostage"] else None,
+               "fp4":           lambda v: (v["M3"].gm() / (2 * np.pi * 3 * v["M1"].cgs())) if v["twostage"] else None,
+               "av":            lambda v: v["av_1st"] * v["av_2nd"] if v["twostage"] else v["av_1st"],
+               "rout":          lambda v: v["rout_2nd"] if v["twostage"] else v["rout_1st"]})
 
-        plt.title("Gain (Blue), Phase (Red)")
-        fig.tight_layout()
-        plt.show()
\ No newline at end of file
+class FoldedCascodeSweep(Sweep):
+    TOPOLOGY = FoldedCascode
+    SCALARS  = ["itail", "iout", "Cc", "CL"]
+    FLAGS    = ["twostage"]
+    DEVICES  = FoldedCascode.DEVICES
+    OUTPUTS  = FoldedCascode.STATE + ["av", "rout", "power"]
@@ -0,0 +1,66 @@
+import numpy as np
+import numpy.typing as npt
+from typing import Any, Iterator
+
+# Batched frequency response of all-pole amplifiers,
+#   H(f) = A0 / prod(1 + j f/p_i)
+# for an (n_designs x n_poles) pole array and a gain vector, on a log
+# frequency grid shared by all designs. Poles are in Hz and NaN marks a
+# missing pole, so topologies with fewer poles can share an array.
+#
+# Magnitude and phase are sums over the last axis of one broadcast
+# (design x frequency x pole) array. response() evaluates it in chunks of
+# designs so the intermediate never exceeds max_elements.
+
+MAX_ELEMENTS = 1 << 24
+
+def frequencies(start: float = 1.0, stop: float = 1e9, points: int = 1000) -> npt.NDArray[np.float64]:
+    return np.logspace(np.log10(start), np.log10(stop), points)
+
+def span(poles: npt.ArrayLike, points: int = 1000) -> npt.NDArray[np.float64]:
+    # Grid from two decades below the lowest to two above the highest pole
+    p = np.asarray(poles, dtype=np.float64)
+    return np.logspace(np.floor(np.log10(np.nanmin(p))) - 2, np.ceil(np.log10(np.nanmax(p))) + 2, points)
+
+def as_poles(poles: npt.ArrayLike, dtype: Any = np.float64) -> npt.NDArray[Any]:
+    p = np.asarray(poles, dtype=dtype)
+    return p[None, :] if p.ndim == 1 else p
+
+# The kernels take f broadcastable against the design axes of p, i.e. one
+# frequency per design, or a grid with p reshaped to (n, 1, n_poles)
+
+def log_magnitude(p: npt.NDArray[Any], f: npt.NDArray[Any]) -> npt.NDArray[Any]:
+    # ln|H| - ln A0
+    result: npt.NDArray[Any] = -0.5 * np.nansum(np.log1p((f[..., None] / p) ** 2), axis=-1)
+    return result
+
+def phase(p: npt.NDArray[Any], f: npt.NDArray[Any]) -> npt.NDArray[Any]:
+    # Degrees, unwrapped
+    result: npt.NDArray[Any] = -np.degrees(np.nansum(np.arctan(f[..., None] / p), axis=-1))
+    return result
+
+def iter_response(poles: npt.ArrayLike, gain: npt.ArrayLike, f: npt.ArrayLike, dtype: Any = np.float64,
+                  max_elements: int = MAX_ELEMENTS) -> Iterator[tuple[int, npt.NDArray[Any], npt.NDArray[Any]]]:
+    # (first design, magnitude [dB], phase [deg]) per chunk of designs
+    p = as_poles(poles, dtype)
+    gain = np.broadcast_to(np.asarray(gain, dtype=dtype), p.shape[:1])
+    f = np.asarray(f, dtype=dtype)
+    rows = max(1, max_elements // max(1, f.size * p.shape[1]))
+    db = np.dtype(dtype).type(20 / np.log(10))
+    for start in range(0, len(p), rows):
+        chunk = p[start:start + rows, None, :]
+        with np.errstate(divide="ignore"):
+            mag = 20 * np.log10(np.abs(gain[start:start + rows]))[:, None] + db * log_magnitude(chunk, f)
+        yield start, mag, phase(chunk, f)
+
+def response(poles: npt.ArrayLike, gain: npt.ArrayLike, f: npt.ArrayLike, dtype: Any = np.float64,
+             max_elements: int = MAX_ELEMENTS) -> tuple[npt.NDArray[Any], npt.NDArray[Any]]:
+    # Magnitude [dB] and phase [deg], both (n_designs x n_frequencies)
+    p = as_poles(poles, dtype)
+    f = np.asarray(f, dtype=dtype)
+    mag = np.empty((len(p), f.size), dtype=dtype)
+    ph = np.empty((len(p), f.size), dtype=dtype)
+    for start, m, a in iter_response(p, gain, f, dtype, max_elements):
+        mag[start:start + len(m)] = m
+        ph[start:start + len(a)] = a
+    return mag, ph
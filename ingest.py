@@ -0,0 +1,328 @@
+import argparse
+import csv
+import itertools
+import os
+import time
+import numpy as np
+import numpy.typing as npt
+from abc import ABC, abstractmethod
+from typing import IO, Generator, Iterator, Optional
+from _datahandler import MODELLIST, model_base
+from _modeltable import Key, ModelTable, fmt, parse_column
+
+# Streaming import of simulator exports into the tensor format that
+# DataHandler memory-maps (see convert_models.py). Sources are read in chunks
+# of sweep points and written straight into the memory-mapped .npy file, so
+# memory use is bounded by the chunk size, not by the size of the sweep.
+#
+# Supported sources, one sweep point per row:
+#   .csv    a header of column names as in the pickled models, e.g.
+#           "M0:gm (vds=3.00e-01,length=1.00e-06) Y", X columns are skipped
+#   .raw    ngspice raw files, ASCII or binary, one or more plots; the first
+#           variable of each plot is the sweep
+#   .psf    PSF-ASCII (Cadence), the sweep followed by one trace per column
+# Vector and trace names are parsed like the column names, the trailing
+# " Y" is optional there. Exports with plain simulator names (e.g. ngspice
+# "@m.xm1.m0[gm]") are mapped with a NameMap instead: the vectors of each
+# model parameter, and vds and L as numbers or as vectors holding the value
+# of each plot.
+#
+#   python ingest.py -m nch export.raw
+#   python ingest.py -o models/nch_full_sim part1.csv part2.csv
+#   python ingest.py -m nch sweep.raw --param gm=@m1[gm] --param gds=@m1[gds] \
+#       --param id=@m1[id] --param cgg=@m1[cgg] --vds v(d) --length @m1[l]
+
+# Values read per chunk, spread over the columns of a source
+CHUNK_VALUES = 1 << 22
+
+def parse_name(name: str) -> Optional[Key]:
+    name = name.strip().strip('"')
+    if name.endswith(" X"):
+        return None
+    return parse_column(name if name.endswith(" Y") else name + " Y")
+
+class Segment(ABC):
+    # A block of columns over the full sweep, read in chunks of rows
+    def __init__(self, path: str, names: list[str], points: int) -> None:
+        self.path: str          = path
+        self.names: list[str]   = names
+        self.points: int        = points
+
+    @abstractmethod
+    def read(self, rows: int) -> Generator[npt.NDArray[np.float64], None, None]:
+        ...
+
+    def first(self) -> npt.NDArray[np.float64]:
+        # Values of the first sweep point
+        blocks = self.read(1)
+        try:
+            row: npt.NDArray[np.float64] = next(blocks)[0]
+            return row
+        finally:
+            blocks.close()
+
+class NameMap:
+    # Model columns of exports named by the simulator. params maps vector
+    # names to model parameters ("gm", "gds", "id", "cgg", ...); vds and
+    # length are numbers, or names of vectors whose first value in each
+    # plot is used. Names are compared case-insensitively, ngspice lowers
+    # them.
+    def __init__(self, params: dict[str, str], vds: str, length: str) -> None:
+        self.params: dict[str, str] = {name.lower(): param for name, param in params.items()}
+        self.vds: str               = vds
+        self.length: str            = length
+
+    def keys(self, seg: Segment) -> list[Optional[Key]]:
+        names = [name.strip().strip('"').lower() for name in seg.names]
+        if not any(name in self.params for name in names):
+            return [None] * len(names)
+        vds, length = self.value(self.vds, seg, names), self.value(self.length, seg, names)
+        return [(self.params[name], fmt(vds), fmt(length)) if name in self.params else None for name in names]
+
+    def value(self, spec: str, seg: Segment, names: list[str]) -> float:
+        try:
+            return float(spec)
+        except ValueError:
+            pass
+        if spec.lower() not in names:
+            raise ValueError("No vector {} in {}".format(spec, seg.path))
+        return float(seg.first()[names.index(spec.lower())])
+
+def ascii_values(f: IO[bytes]) -> Iterator[float]:
+    # Values of an ASCII raw plot: "index<tab>value" then "<tab>value" per
+    # variable, points separated by blank lines; complex values are "re,im"
+    for line in f:
+        fields = line.split()
+        if fields:
+            yield float(fields[-1].split(b",")[0])
+
+class CsvSegment(Segment):
+    def __init__(self, path: str) -> None:
+        with open(path) as f:
+            # Names contain commas and are quoted
+            names = next(csv.reader([next(f)]))
+            points = sum(1 for line in f if line.strip())
+        super().__init__(path, names, points)
+
+    def read(self, rows: int) -> Generator[npt.NDArray[np.float64], None, None]:
+        with open(self.path) as f:
+            next(f)
+            while True:
+                lines = list(itertools.islice(f, rows))
+                if not lines:
+                    return
+                yield np.loadtxt(lines, delimiter=",", ndmin=2, dtype=np.float64)
+
+class RawSegment(Segment):
+    # One plot of an ngspice raw file, starting at offset
+    def __init__(self, path: str, names: list[str], points: int, offset: int,
+                 binary: bool, complex: bool) -> None:
+        super().__init__(path, names, points)
+        self.offset: int    = offset
+        self.binary: bool   = binary
+        self.complex: bool  = complex
+
+    def read(self, rows: int) -> Generator[npt.NDArray[np.float64], None, None]:
+        k = len(self.names)
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            values = ascii_values(f)
+            done = 0
+            while done < self.points:
+                n = min(rows, self.points - done)
+                if self.binary:
+                    dtype = np.dtype("<c16" if self.complex else "<f8")
+                    block = np.frombuffer(f.read(n * k * dtype.itemsize), dtype=dtype).real
+                else:
+                    block = np.fromiter(itertools.islice(values, n * k), dtype=np.float64)
+                if len(block) < n * k:
+                    raise ValueError("{} ends after {} of {} points".format(self.path, done + len(block) // k, self.points))
+                yield np.asarray(block, dtype=np.float64).reshape(n, k)
+                done += n
+
+def raw_segments(path: str) -> list[RawSegment]:
+    segments: list[RawSegment] = []
+    with open(path, "rb") as f:
+        header: dict[str, str] = {}
+        names: list[str] = []
+        while True:
+            line = f.readline()
+            if not line:
+                return segments
+            text = line.decode("latin-1").strip()
+            key, _, value = text.partition(":")
+            key = key.strip().lower()
+            if key == "variables":
+                k = int(header["no. variables"])
+                # "<index> <name> <type>", names may contain spaces
+                names = [f.readline().decode("latin-1").split(None, 1)[1].rsplit(None, 1)[0] for _ in range(k)]
+            elif key in ("values", "binary"):
+                points = int(header["no. points"])
+                binary = key == "binary"
+                cplx = "complex" in header.get("flags", "")
+                segments.append(RawSegment(path, names, points, f.tell(), binary, cplx))
+                # Skip to the next plot
+                if binary:
+                    f.seek(points * len(names) * (16 if cplx else 8), os.SEEK_CUR)
+                else:
+                    skip = points * len(names)
+                    while skip > 0:
+                        line = f.readline()
+                        if not line:
+                            break
+                        skip -= 1 if line.strip() else 0
+                header = {}
+            elif key:
+                header[key] = value.strip().lower()
+
+class PsfSegment(Segment):
+    # PSF-ASCII sweep: the VALUE section holds a "name" value line for the
+    # sweep and for every trace, per point
+    def __init__(self, path: str) -> None:
+        names: list[str] = []
+        section = ""
+        prop = False
+        with open(path) as f:
+            for line in f:
+                text = line.strip()
+                if prop:
+                    # Inside a PROP( ... ) block
+                    prop = text != ")"
+                elif text in ("HEADER", "TYPE", "SWEEP", "TRACE", "VALUE", "END"):
+                    section = text
+                    if text == "VALUE":
+                        break
+                elif section in ("SWEEP", "TRACE") and text.startswith('"'):
+                    names.append(text.split('"')[1])
+                if text.endswith("PROP("):
+                    prop = True
+            count = sum(1 for line in f if line.startswith('"'))
+        super().__init__(path, names, count // max(len(names), 1))
+
+    def read(self, rows: int) -> Generator[npt.NDArray[np.float64], None, None]:
+        k = len(self.names)
+        with open(self.path) as f:
+            for line in f:
+                if line.strip() == "VALUE":
+                    break
+            values = (float(line.rsplit(None, 1)[1]) for line in f if line.startswith('"'))
+            while True:
+                block = np.fromiter(itertools.islice(values, rows * k), dtype=np.float64)
+                if len(block) == 0:
+                    return
+                yield block.reshape(-1, k)
+
+def segments(path: str) -> list[Segment]:
+    ext = os.path.splitext(path)[1].lower()
+    match ext:
+        case ".csv":
+            return [CsvSegment(path)]
+        case ".raw":
+            return list(raw_segments(path))
+        case ".psf":
+            return [PsfSegment(path)]
+        case _:
+            raise ValueError("Unknown export format: {}".format(path))
+
+class IngestReport:
+    def __init__(self) -> None:
+        self.rows: int      = 0
+        self.values: int    = 0
+        self.columns: int   = 0
+        self.seconds: float = 0.0
+
+    def summary(self) -> str:
+        rate = self.rows / self.seconds if self.seconds > 0 else 0.0
+        return "Ingested {} rows, {} columns ({:.3e} values) in {:.2f} s, {:.3e} rows/s".format(
+               self.rows, self.columns, self.values, self.seconds, rate)
+
+def ingest(paths: list[str], base: str, chunk_values: int = CHUNK_VALUES,
+           names: Optional[NameMap] = None) -> IngestReport:
+    # Writes base.npy/base.json from the given exports, which must share one
+    # sweep. Columns are named as in the models unless names maps them.
+    start = time.perf_counter()
+    report = IngestReport()
+    parts = [seg for path in paths for seg in segments(path)]
+    columns = [[parse_name(name) for name in seg.names] if names is None else names.keys(seg) for seg in parts]
+
+    # Grid axes from the column keys
+    keys: dict[Key, None] = {}
+    for seg_keys in columns:
+        for key in seg_keys:
+            if key is not None:
+                keys.setdefault(key)
+    if not keys:
+        raise ValueError("No model columns found in {}".format(", ".join(paths)))
+    points = {seg.points for seg, seg_keys in zip(parts, columns) if any(seg_keys)}
+    if len(points) != 1:
+        raise ValueError("Exports have different sweep lengths: {}".format(sorted(points)))
+    n = points.pop()
+
+    params  = list(dict.fromkeys(k[0] for k in keys))
+    vdsrc   = sorted({float(k[1]) for k in keys})
+    lengths = sorted({float(k[2]) for k in keys})
+    table = ModelTable(np.empty((0, 0, 0, 0)), params, vdsrc, lengths)
+    shape = (len(params), len(vdsrc), len(lengths), n)
+    data = np.lib.format.open_memmap(base + ".npy", mode="w+", dtype=np.float64, shape=shape)
+    flat = data.reshape(-1, n)
+
+    present = np.zeros(shape[:3], dtype=bool)
+    for seg, seg_keys in zip(parts, columns):
+        # Columns of this segment and their rows in the flattened tensor,
+        # first occurrence of a key wins
+        cols, targets = [], []
+        for j, key in enumerate(seg_keys):
+            if key is None:
+                continue
+            pos = table.index[key]
+            if present[pos]:
+                continue
+            present[pos] = True
+            cols.append(j)
+            targets.append(np.ravel_multi_index(pos, shape[:3]))
+        if not cols:
+            continue
+        report.columns += len(cols)
+        row = 0
+        for block in seg.read(max(1, chunk_values // len(seg.names))):
+            flat[targets, row:row + len(block)] = block[:, cols].T
+            row += len(block)
+            report.rows += len(block)
+            report.values += len(block) * len(cols)
+
+    missing = [(int(p), int(v), int(l)) for p, v, l in np.argwhere(~present)]
+    for pos in missing:
+        data[pos] = np.nan
+    data.flush()
+    del flat, data
+    ModelTable(np.empty((0, 0, 0, 0)), params, vdsrc, lengths, missing).save_axes(base)
+    report.seconds = time.perf_counter() - start
+    return report
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stream simulator exports into the tensor model format")
+    parser.add_argument("paths", nargs="+", help=".csv, .raw or .psf exports of one model")
+    parser.add_argument("-m", "--model", choices=list(MODELLIST), help="Write to the model's file in models/")
+    parser.add_argument("-o", "--output", default="", help="Output path without extension")
+    parser.add_argument("--chunk", type=int, default=CHUNK_VALUES, help="Values read per chunk")
+    parser.add_argument("--param", action="append", default=[], metavar="PARAM=VECTOR",
+                        help="Vector holding a model parameter, for exports with simulator names")
+    parser.add_argument("--vds", default="", help="vds of the exports, a number or a vector name")
+    parser.add_argument("--length", default="", help="L of the exports, a number or a vector name")
+    args = parser.parse_args()
+    if not args.output and not args.model:
+        parser.error("Either --model or --output is required")
+    names = None
+    if args.param:
+        if not args.vds or not args.length:
+            parser.error("--param requires --vds and --length")
+        params = {vector: param for param, vector in (p.split("=", 1) for p in args.param)}
+        names = NameMap(params, args.vds, args.length)
+
+    base = args.output or model_base(args.model)
+    report = ingest(args.paths, base, args.chunk, names)
+    print(report.summary())
+    print("Wrote {}.npy".format(base))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import copy
+import os
+import time
+import numpy as np
+import numpy.typing as npt
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+from parallel import SharedModels, attach
+from sensitivity import knob_bounds
+from stability import from_results
+
+# Spec-driven sizing. Starting from a configured TwoStage, FoldedCascode or
+# OTA (which supplies the device models, vdsrc and flags), the optimizer
+# searches per-device gm/id and L, itail, iout and Cc for the lowest power
+# design meeting the specs. Several local searches from random starts run in
+# parallel processes. Every iteration evaluates a whole population of
+# candidate designs as one vectorized sweep.
+
+class Specs:
+    def __init__(self) -> None:
+        # Minimum open-loop gain
+        self.gain_db: float         = 0.0
+        # Minimum gain-bandwidth product
+        self.gbw: float             = 0.0
+        # Minimum phase margin at the closed-loop gain (cl_gain)
+        self.phase_margin: float    = 0.0
+        # Maximum power consumption
+        self.power: float           = np.inf
+        # Load capacitance, the template's if None
+        self.CL: Optional[float]    = None
+
+# Knobs searched on a log scale, all others are searched linearly
+LOG_KNOBS = ("itail", "iout", "Cc", "gateL")
+
+class OptimizationResult:
+    def __init__(self) -> None:
+        self.design: dict[str, float]   = {}
+        self.metrics: dict[str, float]  = {}
+        self.feasible: bool             = False
+        self.evaluations: int           = 0
+        self.wall: float                = 0.0
+        self.starts: int                = 0
+
+    def rate(self) -> float:
+        return self.evaluations / self.wall if self.wall > 0 else 0.0
+
+    def summary(self) -> str:
+        lines = ["{} after {} evaluations from {} starts in {:.2f} s ({:.3e} evaluations/s)".format(
+                 "Feasible" if self.feasible else "No feasible design", self.evaluations, self.starts, self.wall, self.rate())]
+        for name, value in self.metrics.items():
+            lines.append("  {:<14} {:.3e}".format(name, value))
+        for name, value in self.design.items():
+            lines.append("  {:<14} {:.3e}".format(name, value))
+        return "\n".join(lines)
+
+    def apply(self, topology: Any) -> None:
+        # Writes the design to a topology, call init() afterwards
+        for name, value in self.design.items():
+            if "_" in name and name.split("_", 1)[0] in topology.DEVICES:
+                dev, ax = name.split("_", 1)
+                getattr(topology, dev).interpolate = True
+                setattr(getattr(topology, dev), ax, value)
+            else:
+                setattr(topology, name, value)
+
+class Optimizer:
+    def __init__(self, template: Any, specs: Specs) -> None:
+        self.specs = specs
+        self.template = copy.deepcopy(template)
+        if specs.CL is not None:
+            self.template.CL = specs.CL
+        if not self.template.CL > 0:
+            raise ValueError("The load capacitance must be positive, set Specs.CL or the template's CL")
+        self.devices: list[str] = [dev for dev in self.template.DEVICES
+                                   if getattr(self.template, dev).model != ""]
+        for dev in self.devices:
+            # Continuous search needs interpolated lookups
+            getattr(self.template, dev).interpolate = True
+        self.sweep = self.template.sweep()
+        self.bounds: dict[str, tuple[float, float]] = self.default_bounds()
+        # Candidates per local search iteration
+        self.population: int    = 128
+        self.iterations: int    = 200
+
+    def default_bounds(self) -> dict[str, tuple[float, float]]:
+        bounds: dict[str, tuple[float, float]] = {}
+        for name, lo, hi in (("itail", 100e-9, 100e-6), ("iout", 100e-9, 200e-6), ("Cc", 10e-15, 10e-12)):
+            if name in self.sweep.SCALARS:
+                bounds[name] = (lo, hi)
+        # L spans the grid of each device's model, gm/id the range of its
+        # curves at the device's vds and L (see sensitivity.knob_bounds)
+        for dev in self.devices:
+            for ax in ("gmoverid", "gateL"):
+                name = "{}_{}".format(dev, ax)
+                bounds[name] = knob_bounds(self.template, name)
+        return bounds
+
+    def knobs(self) -> list[str]:
+        return list(self.bounds.keys())
+
+    def values(self, u: npt.NDArray[np.float64]) -> dict[str, npt.NDArray[np.float64]]:
+        # Maps normalized coordinates in [0, 1] to knob values
+        params = {}
+        for i, name in enumerate(self.knobs()):
+            lo, hi = self.bounds[name]
+            if name.endswith(LOG_KNOBS):
+                params[name] = lo * (hi / lo) ** u[..., i]
+            else:
+                params[name] = lo + (hi - lo) * u[..., i]
+        return params
+
+    def metrics(self, res: npt.NDArray[Any]) -> dict[str, npt.NDArray[np.float64]]:
+        stab = from_results(res, self.template.cl_gain)
+        with np.errstate(divide="ignore"):
+            return {"gain_db":      20 * np.log10(np.abs(res["av"])),
+                    "gbw":          stab["gbw"],
+                    "phase_margin": stab["phase_margin"],
+                    "power":        res["power"]}
+
+    def score(self, m: dict[str, npt.NDArray[np.float64]]) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+        # Spec violation (normalized, 0 when feasible) and score; any
+        # violation ranks below every feasible design, which rank by power
+        s = self.specs
+        with np.errstate(divide="ignore", invalid="ignore"):
+            violation = np.maximum(0, (s.gain_db - m["gain_db"]) / 10)
+            if s.gbw > 0:
+                violation += np.maximum(0, np.log10(s.gbw / m["gbw"]))
+            violation += np.maximum(0, (s.phase_margin - m["phase_margin"]) / 10)
+            if np.isfinite(s.power):
+                violation += np.maximum(0, np.log10(m["power"] / s.power))
+        violation = np.nan_to_num(violation, nan=1e6, posinf=1e6)
+        return violation, violation * 1e6 + m["power"]
+
+    def evaluate(self, u: npt.NDArray[np.float64]) -> tuple[npt.NDArray[Any], npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+        res = self.sweep.evaluate(**self.values(u))
+        violation, score = self.score(self.metrics(res))
+        return res, violation, score
+
+    def local_search(self, seed: int) -> dict[str, Any]:
+        rng = np.random.default_rng(seed)
+        k = len(self.knobs())
+
+        # Start from the best of a random batch
+        u = rng.random((self.population * 4, k))
+        _, _, score = self.evaluate(u)
+        evaluations = len(u)
+        best = int(np.argmin(score))
+        x, best_score = u[best], float(score[best])
+
+        sigma = 0.2
+        for _ in range(self.iterations):
+            cand = np.clip(x + sigma * rng.standard_normal((self.population, k)), 0.0, 1.0)
+            _, _, score = self.evaluate(cand)
+            evaluations += len(cand)
+            i = int(np.argmin(score))
+            if score[i] < best_score:
+                x, best_score = cand[i], float(score[i])
+                sigma = min(sigma * 1.5, 0.5)
+            else:
+                sigma *= 0.6
+                if sigma < 1e-4:
+                    break
+        return {"x": x, "score": best_score, "evaluations": evaluations}
+
+    def run(self, starts: int = 8, workers: int = 0, seed: int = 0) -> OptimizationResult:
+        workers = min(workers or os.cpu_count() or 1, starts)
+        seeds = [seed + i for i in range(starts)]
+        start_time = time.perf_counter()
+        if workers == 1:
+            runs = [self.local_search(s) for s in seeds]
+        else:
+            shared = SharedModels(getattr(self.template, dev).model for dev in self.devices)
+            try:
+                with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(shared.specs, self)) as ex:
+                    runs = list(ex.map(_local_search, seeds))
+            finally:
+                shared.close()
+
+        best = min(runs, key=lambda r: r["score"])
+        res, violation, _ = self.evaluate(best["x"][None, :])
+        result = OptimizationResult()
+        result.design = {name: float(v[0]) for name, v in self.values(best["x"][None, :]).items()}
+        result.metrics = {name: float(v[0]) for name, v in self.metrics(res).items()}
+        result.feasible = bool(violation[0] == 0)
+        result.evaluations = sum(r["evaluations"] for r in runs)
+        result.starts = starts
+        result.wall = time.perf_counter() - start_time
+        return result
+
+# Worker process state
+_optimizer: Optional[Optimizer] = None
+
+def _init_worker(specs: list[Any], optimizer: Optimizer) -> None:
+    global _optimizer
+    attach(specs)
+    _optimizer = optimizer
+
+def _local_search(seed: int) -> dict[str, Any]:
+    assert _optimizer is not None
+    return _optimizer.local_search(seed)
@@ -1,35 +1,48 @@
 import numpy as np
-import scipy as sp
-import matplotlib.pyplot as plt
-from tabulate import tabulate
 from utils import Utils
 from transistor import MosDevice
+from devicebank import DeviceBank
+from sweep import Sweep
+from sensitivity import STEP, Jacobian, jacobian
+import freqresp
+from stability import metrics as stability_metrics
+from typing import Any, Mapping
+from _instrument import timed
+from _graph import Graph, GraphState
+
+utils = Utils()
 
 # Three-mirror OTA
 # "A Low-Power, Low-Noise CMOS Amplifier for Neural Recording Applications"
 # Reid R. Harrison
 
 class OTA:
+    DEVICES = ["M0", "M1", "M2", "M3", "M4"]
+    # Attributes set by __calculate
+    STATE   = ["GM_val", "rout_val", "fp1", "fp2", "fp3", "fp4", "av_val"]
+    
     def __init__(self) -> None:
         self.utils = Utils()
+        # Inputs and operating points of all devices (see devicebank.py)
+        self.bank = DeviceBank()
         
         # Closed loop gain
         self.cl_gain: float = 0.0
         
         # Input PMOS
-        self.M0 = MosDevice()
+        self.M0 = MosDevice(self.bank)
         
         # NMOS Mirror
-        self.M1 = MosDevice()
+        self.M1 = MosDevice(self.bank)
         
         # NMOS Cascode
-        self.M2 = MosDevice()
+        self.M2 = MosDevice(self.bank)
         
         # PMOS Mirror
-        self.M3 = MosDevice()
+        self.M3 = MosDevice(self.bank)
         
         # PMOS Cascode
-        self.M4 = MosDevice()
+        self.M4 = MosDevice(self.bank)
         
         self.itail: float       = 0.0
         self.GM_val: float      = 0.0
@@ -45,33 +58,60 @@ class OTA:
         # PMOS Mirror Pole
         self.fp4: float     = 0.0
         
+        # Derived quantities of the last init()
+        self.graph = GraphState()
+        
+    @timed()
     def init(self) -> None:
-        self.M0.set_id(self.itail/2)
-        self.M1.set_id(self.itail/2)
-        self.M2.set_id(self.itail/2)
-        self.M3.set_id(self.itail/2)
-        self.M4.set_id(self.itail/2)
+        for name, id in self.currents(vars(self)).items():
+            getattr(self, name).set_id(id)
+        # All devices in one go, a batched lookup per model
+        self.bank.resolve()
         
         self.__calculate()
             
+    @timed()
     def __calculate(self) -> None:
-        self.GM_val = self.M0.gm()
-        nmos_ro = self.utils.cascode(self.M1.ro(), self.M2.ro(), self.M2.gm())
-        pmos_ro = self.utils.cascode(self.M3.ro(), self.M4.ro(), self.M4.gm())
-        self.rout_val = self.utils.parallel([nmos_ro, pmos_ro])
-        
-        self.fp1 = (1 / (2 * np.pi * self.rout_val * self.CL))
-        self.fp2 = (self.M1.gm() / (8 * np.pi * self.M1.cgs()))
-        self.fp3 = (self.M1.gm() / (8 * np.pi * self.M1.cgs()))
-        self.fp4 = (self.M3.gm() / (8 * np.pi * self.M3.cgs()))
+        # Only the quantities whose inputs changed since the last call are
+        # recomputed (see _graph.py)
+        out = GRAPH.update(vars(self), {name: getattr(self, name) for name in self.DEVICES}, self.graph)
+        for name in self.STATE:
+            setattr(self, name, out[name])
+        
+    # Like TwoStage, the equations work on a single design or on arrays of
+    # designs (see OTASweep)
+    @staticmethod
+    def currents(p: Mapping[str, Any]) -> dict[str, Any]:
+        return {"M0": p["itail"]/2,
+                "M1": p["itail"]/2,
+                "M2": p["itail"]/2,
+                "M3": p["itail"]/2,
+                "M4": p["itail"]/2}
+    
+    @staticmethod
+    def equations(p: Mapping[str, Any], M: Mapping[str, Any]) -> dict[str, Any]:
+        return GRAPH.evaluate(p, M)
+    
+    @staticmethod
+    def consumption(p: Mapping[str, Any]) -> Any:
+        return (p["itail"]*2) * 1.2 # Assuming 1.2 VDD
+    
+    def sweep(self) -> "OTASweep":
+        # Vectorized evaluation of many designs based on this one
+        return OTASweep(self)
         
-        self.av_val = self.rout_val * self.M0.gm()
+    def sensitivity(self, knobs: list[str] | None = None, outputs: list[str] | None = None,
+                    step: float = STEP) -> Jacobian:
+        # Derivatives of the metrics with respect to the sizing knobs, from
+        # one batched evaluation (see sensitivity.py)
+        return jacobian(self, knobs, outputs, step)
         
     def characterize(self, latex: bool) -> None:
+        from tabulate import tabulate
         av  = np.round(20*np.log10(self.av()), 2)
         poles = self.poles()
         sizes = self.size()
-        power = (self.itail*2) * 1.2 # Assuming 1.2 VDD
+        power = self.power()
         
         poles_formatted = []
         for pole in poles:
@@ -93,6 +133,20 @@ class OTA:
     def av(self) -> float:
         return self.rout_val * self.GM_val
     
+    def power(self) -> float:
+        result: float = self.consumption(vars(self))
+        return result
+    
+    def area(self) -> float:
+        # Gate area of all devices in use
+        return self.utils.area([getattr(self, name) for name in self.currents(vars(self))])
+    
+    def stability(self) -> dict[str, float]:
+        # Unity-gain frequency, GBW and phase margin at cl_gain, computed from
+        # the poles without a bode plot
+        res = stability_metrics(self.poles(), self.av(), self.cl_gain)
+        return {name: float(value[0]) for name, value in res.items()}
+    
     def rout(self) -> float:
         return self.rout_val
     
@@ -111,34 +165,27 @@ class OTA:
         return {"W0": W0, "W1": W1, "W2": W2, "W3": W3, "W4": W4}
     
     def bode(self) -> None:
-        poles = self.poles()
-        p1 = poles[0]
-        p2 = poles[1]
-        p3 = poles[2]
-        p4 = poles[3]
-        den4 = [1, p1+p2+p3+p4, p1*p2+p1*p3+p1*p4+p2*p3+p2*p4+p3*p4, p1*p2*p3+p1*p2*p4+p1*p3*p4+p2*p3*p4, p1*p2*p3*p4]
-        K = den4[-1] * self.av()
-        
-        sys = sp.signal.TransferFunction([K], den4)
-        w, mag, phase = sp.signal.bode(sys)
-
-        fig, ax = plt.subplots()
-        fig.set_size_inches(12, 8)
-
-        ax.set_xlabel('Frequency [Hz]')
-        ax.set_ylabel('Magnitude [dB]')
-        ax.semilogx(w, mag)
-
-        ax2 = ax.twinx()
-        ax2.semilogx(w, phase, color="red")
-        ax2.set_ylabel('Phase [deg]')
-        ax.grid()
+        f = freqresp.span(self.poles())
+        mag, phase = freqresp.response(self.poles(), self.av(), f)
+        print("Phase Margin: {}".format(self.stability()["phase_margin"]))
+        self.utils.plot_bode(f, mag[0], phase[0])
 
-        for i in range(0, len(mag)):
-            if mag[i] < self.cl_gain:
-                print("Phase Margin: {}".format(180+phase[i]))
-                break
+# Derived quantities of an OTA and what they depend on (see _graph.py)
+GRAPH = Graph({"GM_val":    lambda v: v["M0"].gm(),
+               "nmos_ro":   lambda v: utils.cascode(v["M1"].ro(), v["M2"].ro(), v["M2"].gm()),
+               "pmos_ro":   lambda v: utils.cascode(v["M3"].ro(), v["M4"].ro(), v["M4"].gm()),
+               "rout_val":  lambda v: utils.parallel([v["nmos_ro"], v["pmos_ro"]]),
+               "av_val":    lambda v: v["rout_val"] * v["M0"].gm(),
+               "fp1":       lambda v: (1 / (2 * np.pi * v["rout_val"] * v["CL"])),
+               "fp2":       lambda v: (v["M1"].gm() / (8 * np.pi * v["M1"].cgs())),
+               "fp3":       lambda v: (v["M1"].gm() / (8 * np.pi * v["M1"].cgs())),
+               "fp4":       lambda v: (v["M3"].gm() / (8 * np.pi * v["M3"].cgs())),
+               "av":        lambda v: v["rout_val"] * v["GM_val"],
+               "rout":      lambda v: v["rout_val"],
+               "power":     lambda v: OTA.consumption(v)})
 
-        plt.title("Gain (Blue), Phase (Red)")
-        fig.tight_layout()
-        plt.show()
\ No newline at end of file
+class OTASweep(Sweep):
+    TOPOLOGY = OTA
+    SCALARS  = ["itail", "CL"]
+    DEVICES  = OTA.DEVICES
+    OUTPUTS  = OTA.STATE + ["av", "rout", "power"]
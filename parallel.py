@@ -0,0 +1,133 @@
+import os
+import time
+import numpy as np
+import numpy.typing as npt
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Hashable, Iterable, Iterator, Optional
+import _datahandler
+from _datahandler import model_base, table_key
+from _modeltable import ModelTable, load_model
+from _registry import registry
+from sweep import Sweep
+
+# Multi-process sweeps. The design grid is split into index ranges which are
+# evaluated by a ProcessPoolExecutor. Workers only receive the sweep template
+# and the grid axes; model data is never pickled. Models in the tensor format
+# are memory-mapped by every worker, anything else (including projected or
+# narrowed copies, see _datahandler.PROJECTION) is published once through
+# shared memory. Chunks are yielded in grid order.
+
+SharedSpec = tuple[Hashable, Optional[tuple[Any, ...]]]
+
+class SharedModels:
+    def __init__(self, models: Iterable[str]) -> None:
+        self.specs: list[SharedSpec]                        = []
+        self.blocks: list[shared_memory.SharedMemory]       = []
+        for model in sorted(set(models)):
+            base = model_base(model)
+            params, dtype = _datahandler.PROJECTION, _datahandler.DTYPE
+            key = table_key(base, params, dtype)
+            table: ModelTable = registry.get(key, lambda: load_model(base, params, dtype))
+            if isinstance(table.data, np.memmap):
+                # Workers map the tensor file themselves
+                self.specs.append((key, None))
+                continue
+            shm = shared_memory.SharedMemory(create=True, size=max(table.data.nbytes, 1))
+            np.ndarray(table.data.shape, table.data.dtype, buffer=shm.buf)[...] = table.data
+            self.blocks.append(shm)
+            self.specs.append((key, (shm.name, table.data.shape, table.data.dtype.str,
+                                      table.params, table.vdsrc, table.lengths, table.missing)))
+
+    def close(self) -> None:
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+
+# Worker process state, set up once per worker by _init_worker
+_sweep: Optional[Sweep]                         = None
+_axes: dict[str, Any]                           = {}
+_attached: list[shared_memory.SharedMemory]     = []
+
+def attach(specs: list[SharedSpec]) -> None:
+    # Registers the parent's shared tables in this process's registry
+    for key, spec in specs:
+        if spec is None:
+            continue
+        name, shape, dtype, params, vdsrc, lengths, missing = spec
+        # Workers share the parent's resource tracker, so the block stays
+        # registered to (and is unlinked by) the parent
+        shm = shared_memory.SharedMemory(name=name)
+        _attached.append(shm)
+        data = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+        data.flags.writeable = False
+        table = ModelTable(data, params, vdsrc, lengths, missing)
+        registry.get(key, lambda: table)
+
+def _init_worker(specs: list[SharedSpec], sweep: Sweep, axes: dict[str, Any]) -> None:
+    global _sweep, _axes
+    attach(specs)
+    _sweep = sweep
+    _axes = axes
+
+def _run_chunk(start: int, stop: int) -> tuple[int, npt.NDArray[Any], float]:
+    assert _sweep is not None
+    t = time.perf_counter()
+    res = _sweep.chunk(start, stop, **_axes)
+    return os.getpid(), res, time.perf_counter() - t
+
+class ParallelSweep:
+    def __init__(self, sweep: Sweep, workers: int = 0, chunk: int = 65536) -> None:
+        self.sweep: Sweep   = sweep
+        self.workers: int   = workers or os.cpu_count() or 1
+        self.chunk: int     = chunk
+        # Per worker pid: chunks, designs and busy seconds of the last run
+        self.stats: dict[int, dict[str, float]] = {}
+        self.wall: float    = 0.0
+
+    def models(self) -> list[str]:
+        return [getattr(self.sweep.template, dev).model for dev in self.sweep.DEVICES
+                if getattr(self.sweep.template, dev).model != ""]
+
+    def chunks(self, **axes: npt.ArrayLike) -> Iterator[npt.NDArray[Any]]:
+        n = self.sweep.size(**axes)
+        starts = list(range(0, n, self.chunk))
+        stops = [min(s + self.chunk, n) for s in starts]
+        axes_arr = {name: np.ravel(np.asarray(a)) for name, a in axes.items()}
+
+        self.stats = {}
+        start_time = time.perf_counter()
+        shared = SharedModels(self.models())
+        try:
+            with ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                     initargs=(shared.specs, self.sweep, axes_arr)) as ex:
+                for pid, res, seconds in ex.map(_run_chunk, starts, stops):
+                    entry = self.stats.setdefault(pid, {"chunks": 0, "designs": 0, "seconds": 0.0})
+                    entry["chunks"] += 1
+                    entry["designs"] += len(res)
+                    entry["seconds"] += seconds
+                    self.wall = time.perf_counter() - start_time
+                    yield res
+        finally:
+            shared.close()
+            self.wall = time.perf_counter() - start_time
+
+    def run(self, **axes: npt.ArrayLike) -> npt.NDArray[Any]:
+        # The full grid, merged in order and shaped like the axes
+        shape = [np.size(a) for a in axes.values()]
+        parts = list(self.chunks(**axes))
+        if not parts:
+            return np.empty(shape, dtype=self.sweep.dtype())
+        return np.concatenate(parts).reshape(shape)
+
+    def report(self) -> str:
+        lines = ["{:>8} {:>8} {:>12} {:>10} {:>14}".format("Worker", "Chunks", "Designs", "Busy [s]", "Designs/s")]
+        total = 0
+        for pid, entry in sorted(self.stats.items()):
+            total += int(entry["designs"])
+            rate = entry["designs"] / entry["seconds"] if entry["seconds"] > 0 else 0.0
+            lines.append("{:>8} {:>8} {:>12} {:>10.2f} {:>14.3e}".format(pid, int(entry["chunks"]), int(entry["designs"]), entry["seconds"], rate))
+        rate = total / self.wall if self.wall > 0 else 0.0
+        lines.append("Total: {} designs in {:.2f} s with {} workers, {:.3e} designs/s".format(total, self.wall, self.workers, rate))
+        return "\n".join(lines)
@@ -0,0 +1,90 @@
+import numpy as np
+import numpy.typing as npt
+from typing import Any, Iterable
+
+# Streaming Pareto-front extraction over sweep results. Chunks of designs are
+# merged into the current front one at a time, so only the non-dominated
+# designs are ever held in memory.
+#
+# Objectives are result fields with a sense, e.g.
+#   {"power": "min", "av": "max", "fp1": "max", "area": "min"}
+# Designs with a NaN objective are ignored.
+
+# Candidates compared against each other at once when filtering three or
+# more objectives
+BLOCK = 256
+
+def nondominated(F: npt.NDArray[np.float64]) -> npt.NDArray[np.intp]:
+    # Indices of the non-dominated rows of F (all objectives minimized).
+    # Exact duplicates of a front point are dropped.
+    n, k = F.shape
+    if n == 0:
+        return np.empty(0, dtype=np.intp)
+    order = np.lexsort(F.T[::-1])
+    if k == 1:
+        return order[:1]
+    if k == 2:
+        # Sorted by the first objective, a point is on the front iff its second
+        # objective beats every point before it
+        f1 = F[order, 1]
+        best = np.minimum.accumulate(f1)
+        keep = np.empty(n, dtype=bool)
+        keep[0] = True
+        keep[1:] = f1[1:] < best[:-1]
+        return order[keep]
+
+    # Sort-filter: after sorting lexicographically, a point can only be
+    # dominated by points before it. Candidates are checked in blocks against
+    # the front found so far and then against each other.
+    front: list[npt.NDArray[np.intp]] = []
+    front_F = np.empty((0, k))
+    for start in range(0, n, BLOCK):
+        idx = order[start:start + BLOCK]
+        block = F[idx]
+        if len(front_F):
+            le = np.all(front_F[:, None, :] <= block[None, :, :], axis=2)
+            dominated = np.any(le, axis=0)
+            idx, block = idx[~dominated], block[~dominated]
+        le = np.all(block[:, None, :] <= block[None, :, :], axis=2)
+        # Earlier points in the sorted block that are <= in every objective
+        # dominate (or duplicate) later ones
+        dominated = np.any(np.tril(le.T, k=-1), axis=1)
+        idx, block = idx[~dominated], block[~dominated]
+        front.append(idx)
+        front_F = np.concatenate([front_F, block])
+    return np.concatenate(front)
+
+class ParetoFront:
+    def __init__(self, objectives: dict[str, str]) -> None:
+        for name, sense in objectives.items():
+            if sense not in ("min", "max"):
+                raise ValueError("Objective {} must be 'min' or 'max', not {}".format(name, sense))
+        self.objectives: dict[str, str] = objectives
+        self.front: npt.NDArray[Any]    = np.empty(0)
+        self.seen: int                  = 0
+
+    def costs(self, designs: npt.NDArray[Any]) -> npt.NDArray[np.float64]:
+        cols = [designs[name] if sense == "min" else -designs[name] for name, sense in self.objectives.items()]
+        return np.stack(cols, axis=-1).astype(np.float64)
+
+    def update(self, chunk: npt.NDArray[Any]) -> None:
+        chunk = np.ravel(chunk)
+        self.seen += len(chunk)
+        chunk = chunk[np.all(np.isfinite(self.costs(chunk)), axis=1)]
+        merged = chunk if len(self.front) == 0 else np.concatenate([self.front, chunk])
+        self.front = merged[nondominated(self.costs(merged))]
+
+    def consume(self, chunks: Iterable[npt.NDArray[Any]]) -> "ParetoFront":
+        # e.g. front.consume(ParallelSweep(sw).chunks(**axes))
+        for chunk in chunks:
+            self.update(chunk)
+        return self
+
+    def save(self, path: str) -> None:
+        # CSV for .csv files, otherwise a .npy structured array
+        if path.endswith(".csv"):
+            names = self.front.dtype.names or ()
+            np.savetxt(path, np.column_stack([self.front[n].astype(np.float64) for n in names]) if len(self.front) else np.empty((0, len(names))),
+                       delimiter=",", header=",".join(names), comments="")
+        else:
+            np.save(path, self.front)
@@ -0,0 +1,153 @@
+import copy
+import numpy as np
+import numpy.typing as npt
+from typing import Any, Optional
+from stability import POLE_FIELDS, from_results
+
+# Sensitivities of the metrics of a design to its sizing knobs: the topology
+# currents and compensation (itail, iout, Cc) and the gm/id and L of every
+# device in use. Device currents follow from the topology currents (see
+# currents()), so itail and iout are the current knobs.
+#
+# The Jacobian is estimated by central differences. The design and the two
+# perturbed designs of every knob are evaluated as one array with the
+# topology's sweep, i.e. one batched lookup per device instead of an init()
+# per perturbation. Lookups are interpolated, snapping to the grid would
+# make the gm/id and L derivatives zero. The interpolation clamps L to the
+# model grid and gm/id to the range of the curves at the device's vds and L,
+# so at an edge of either the derivative is one-sided (into the range) and
+# beyond it NaN.
+#
+#   jac = design.sensitivity()
+#   jac["av", "M0_gmoverid"]    # d av / d gm/id of M0
+#   print(jac.summary())        # normalized, d ln(metric) / d ln(knob)
+
+# Relative step of every knob
+STEP = 1e-3
+
+# Metrics of the design, followed by its poles and device widths
+METRICS = ["av", "av_db", "rout", "power", "area", "ugf", "gbw", "phase_margin"]
+
+class Jacobian:
+    def __init__(self) -> None:
+        self.knobs: list[str]                   = []
+        self.outputs: list[str]                 = []
+        # Knob values and metrics of the design
+        self.values: dict[str, float]           = {}
+        self.metrics: dict[str, float]          = {}
+        # d output / d knob, a row per output and a column per knob
+        self.matrix: npt.NDArray[np.float64]    = np.zeros((0, 0))
+
+    def __getitem__(self, key: tuple[str, str]) -> float:
+        output, knob = key
+        return float(self.matrix[self.outputs.index(output), self.knobs.index(knob)])
+
+    def row(self, output: str) -> dict[str, float]:
+        # Derivatives of one output with respect to every knob
+        i = self.outputs.index(output)
+        return {knob: float(d) for knob, d in zip(self.knobs, self.matrix[i])}
+
+    def normalized(self) -> npt.NDArray[np.float64]:
+        # d ln(output) / d ln(knob): the relative change of an output per
+        # relative change of a knob, comparable across knobs
+        x = np.array([self.values[knob] for knob in self.knobs])
+        f = np.array([self.metrics[output] for output in self.outputs])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result: npt.NDArray[np.float64] = self.matrix * x[None, :] / f[:, None]
+        return result
+
+    def summary(self) -> str:
+        from tabulate import tabulate
+        table = [[output] + list(row) for output, row in zip(self.outputs, self.normalized())]
+        text: str = tabulate(table, headers=["d ln / d ln"] + self.knobs, floatfmt=".3f")
+        return text
+
+def knob_value(design: Any, name: str) -> float:
+    if "_" in name and name.split("_", 1)[0] in design.DEVICES:
+        dev, ax = name.split("_", 1)
+        return float(getattr(getattr(design, dev), ax))
+    return float(getattr(design, name))
+
+def knob_bounds(design: Any, name: str) -> tuple[float, float]:
+    # Range of a knob covered by the lookups, they are clamped outside it
+    if "_" in name and name.split("_", 1)[0] in design.DEVICES:
+        dev, ax = name.split("_", 1)
+        device = getattr(design, dev)
+        reader = device.bank.reader(device.model)
+        match ax:
+            case "gmoverid":
+                # The range of the curves at the device's vds and L
+                lo, hi = reader.interpolator().limits(device.vdsrc, device.gateL)
+                return float(lo), float(hi)
+            case "gateL":
+                return float(min(reader.table.lengths)), float(max(reader.table.lengths))
+    return -np.inf, np.inf
+
+def outputs_of(res: npt.NDArray[Any], cl_gain: float) -> dict[str, npt.NDArray[np.float64]]:
+    # Every metric of sweep results
+    names = res.dtype.names or ()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = {"av":        res["av"],
+               "av_db":     20 * np.log10(np.abs(res["av"])),
+               "rout":      res["rout"],
+               "power":     res["power"],
+               "area":      res["area"],
+               **from_results(res, cl_gain)}
+    for name in names:
+        if name in POLE_FIELDS or name.endswith("_width"):
+            out[name] = res[name]
+    return out
+
+def jacobian(design: Any, knobs: Optional[list[str]] = None, outputs: Optional[list[str]] = None,
+             step: float = STEP) -> Jacobian:
+    # Jacobian of the outputs (default: the metrics, poles and widths that
+    # apply to the design) with respect to the knobs (default: all sizing
+    # knobs) at the current design
+    template = copy.deepcopy(design)
+    devices = [dev for dev in template.DEVICES if getattr(template, dev).model != ""]
+    for dev in devices:
+        getattr(template, dev).interpolate = True
+    sweep = template.sweep()
+    if knobs is None:
+        knobs = [name for name in sweep.SCALARS if name != "CL"]
+        knobs += ["{}_{}".format(dev, ax) for dev in devices for ax in sweep.INPUTS]
+    unknown = [name for name in knobs if name not in sweep.parameters() or name in sweep.FLAGS]
+    if unknown:
+        raise ValueError("Unknown sensitivity knobs: {}".format(", ".join(unknown)))
+
+    # Row 0 is the design, rows 1..n step each knob up and rows n+1..2n down
+    n = len(knobs)
+    x = np.array([knob_value(template, name) for name in knobs])
+    h = step * np.where(x != 0, np.abs(x), 1.0)
+    points = np.tile(x, (2 * n + 1, 1))
+    points[1 + np.arange(n), np.arange(n)] += h
+    points[1 + n + np.arange(n), np.arange(n)] -= h
+    res = sweep.evaluate(**{name: points[:, i] for i, name in enumerate(knobs)})
+    out = outputs_of(res, template.cl_gain)
+
+    if outputs is None:
+        names = METRICS + [f for f in POLE_FIELDS if f in out] + ["{}_width".format(dev) for dev in devices]
+        outputs = [name for name in names if np.isfinite(out[name][0])]
+    unknown = [name for name in outputs if name not in out]
+    if unknown:
+        raise ValueError("Unknown sensitivity outputs: {}".format(", ".join(unknown)))
+
+    f = np.stack([out[name] for name in outputs])
+    f0, up, down = f[:, :1], f[:, 1:n + 1], f[:, n + 1:]
+    # One-sided differences where a step would be clamped to the edge of the
+    # model grid, NaN if the design itself is outside it
+    lo, hi = np.array([knob_bounds(template, name) for name in knobs]).T
+    inside = (x >= lo) & (x <= hi)
+    up_ok = (inside & (x + h <= hi))[None, :] & np.isfinite(up)
+    down_ok = (inside & (x - h >= lo))[None, :] & np.isfinite(down)
+    with np.errstate(invalid="ignore"):
+        matrix = np.where(up_ok & down_ok, (up - down) / (2 * h),
+                          np.where(down_ok, (f0 - down) / h, np.where(up_ok, (up - f0) / h, np.nan)))
+
+    result = Jacobian()
+    result.knobs = list(knobs)
+    result.outputs = list(outputs)
+    result.values = {name: float(v) for name, v in zip(knobs, x)}
+    result.metrics = {name: float(out[name][0]) for name in outputs}
+    result.matrix = matrix
+    return result
@@ -0,0 +1,160 @@
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Callable, Mapping
+import _datahandler
+from _datahandler import DataHandler, MODELLIST, model_exists
+from _opcache import opcache
+from _registry import registry
+from _resultcache import results
+from transistor import INPUTS, MosDevice
+from spec import evaluate, number
+
+# Local evaluation daemon. Loads the models once and answers JSON-RPC 2.0
+# requests over HTTP on localhost, so interactive sizing does not pay for
+# imports and model loads on every run. Requests are served by a fixed pool
+# of threads sharing the model registry and the operating point memo.
+#
+#   python server.py --port 8765 --workers 4
+#
+# Methods (params are JSON objects):
+#   evaluate    a design spec (see spec.py), returns its record
+#   batch       {"designs": [spec, ...]}, returns the records in order
+#   lookup      MosDevice inputs (model, gateL, vdsrc, gmoverid, id,
+#               interpolate), returns the operating point
+#   stats       registry, operating point memo and result cache statistics
+#   ping        "pong"
+# Use client.py to call it, which falls back to in-process evaluation when
+# no server is running.
+
+ADDRESS = os.environ.get("ANALOG_SERVER", "127.0.0.1:8765")
+
+def lookup(params: Mapping[str, Any]) -> dict[str, Any]:
+    for name in params:
+        if name not in INPUTS:
+            raise ValueError("Unknown MosDevice parameter: {}".format(name))
+    if params.get("model", "") not in MODELLIST:
+        raise ValueError("Unknown model: {}".format(params.get("model", "")))
+    dev = MosDevice().configure(**{"id": 1.0, **params})
+    if not dev.valid():
+        raise ValueError("Incomplete MosDevice inputs: {}".format(", ".join(INPUTS)))
+    with np.errstate(all="ignore"):
+        return {"gmoverid": number(dev.gmoverid_val),
+                "gmro":     number(dev.gmro_val),
+                "ft":       number(dev.ft_val),
+                "idw":      number(dev.idw_val),
+                "width":    number(dev.w_val),
+                "gm":       number(dev.gm()),
+                "ro":       number(dev.ro()),
+                "cgg":      number(dev.cgg())}
+
+def batch(params: Mapping[str, Any]) -> list[dict[str, Any]]:
+    return [evaluate(spec) for spec in params.get("designs", [])]
+
+def stats(params: Mapping[str, Any]) -> dict[str, Any]:
+    return {"registry": registry.stats(), "opcache": opcache.stats(), "results": results.stats()}
+
+METHODS: dict[str, Callable[[Mapping[str, Any]], Any]] = {"evaluate":  evaluate,
+                                                         "batch":     batch,
+                                                         "lookup":    lookup,
+                                                         "stats":     stats,
+                                                         "ping":      lambda params: "pong"}
+
+def dispatch(method: str, params: Mapping[str, Any]) -> Any:
+    if method not in METHODS:
+        raise ValueError("Unknown method: {}".format(method))
+    return METHODS[method](params)
+
+def preload(models: list[str]) -> list[str]:
+    # Loads the models that exist, returns their names
+    loaded = []
+    for model in models:
+        if model_exists(model):
+            DataHandler().load(model)
+            loaded.append(model)
+    return loaded
+
+class Handler(BaseHTTPRequestHandler):
+    def do_POST(self) -> None:
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except ValueError:
+            self.reply({"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "Parse error"}})
+            return
+        if not isinstance(request, dict):
+            self.reply({"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "Invalid Request"}})
+            return
+        response: dict[str, Any] = {"jsonrpc": "2.0", "id": request.get("id")}
+        method = request.get("method", "")
+        try:
+            if method not in METHODS:
+                response["error"] = {"code": -32601, "message": "Method not found: {}".format(method)}
+            else:
+                response["result"] = dispatch(method, request.get("params") or {})
+        except Exception as e:
+            response["error"] = {"code": -32000, "message": "{}: {}".format(type(e).__name__, e)}
+        self.reply(response)
+
+    def reply(self, response: dict[str, Any]) -> None:
+        body = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+class PoolServer(HTTPServer):
+    # Hands each connection to a fixed thread pool instead of a new thread
+    request_queue_size = 128
+    
+    def __init__(self, address: tuple[str, int], workers: int) -> None:
+        super().__init__(address, Handler)
+        self.pool = ThreadPoolExecutor(workers)
+
+    def process_request(self, request: Any, client_address: Any) -> None:
+        self.pool.submit(self.__process, request, client_address)
+
+    def __process(self, request: Any, client_address: Any) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+def main() -> None:
+    host, port = ADDRESS.rsplit(":", 1)
+    parser = argparse.ArgumentParser(description="Local evaluation server")
+    parser.add_argument("--host", default=host)
+    parser.add_argument("--port", type=int, default=int(port))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Request threads")
+    parser.add_argument("--models", nargs="*", default=list(MODELLIST), help="Models to load at startup")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    loaded = preload(args.models)
+    print("Loaded {} models from {} in {:.2f} s".format(len(loaded), os.path.abspath(_datahandler.MODELDIR),
+          time.perf_counter() - start), file=sys.stderr)
+    server = PoolServer((args.host, args.port), args.workers)
+    print("Serving on http://{}:{} with {} workers".format(args.host, args.port, args.workers), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import json
+import os
+import sys
+import numpy as np
+from typing import Any, Mapping, Optional
+import _datahandler
+from _datahandler import MODELLIST, model_base, model_stamp
+from _resultcache import results
+from ota import OTA
+from twostage import TwoStage
+from folded_cascode import FoldedCascode
+
+# Design specs: plain dicts naming a topology, its attributes and the inputs
+# of each device, e.g.
+#
+#   {"name": "ota", "topology": "OTA", "itail": 4.4e-6, "CL": 600e-15,
+#    "M0": {"model": "pch_25", "gateL": 1e-6, "vdsrc": 0.3, "gmoverid": 27}, ...}
+#
+# Spec files are JSON or TOML holding a list of designs ("design") and
+# optional "defaults" merged into every design. See designs.toml.
+#
+# Records are cached on disk (see _resultcache.py), keyed by the spec, the
+# model file contents and the code evaluating the topology.
+
+TOPOLOGIES: dict[str, Any] = {"OTA":            OTA,
+                              "TwoStage":       TwoStage,
+                              "FoldedCascode":  FoldedCascode}
+
+# Metrics of every design, followed by the topology state and device widths
+METRICS = ["av", "av_db", "rout", "power", "area", "ugf", "gbw", "phase_margin"]
+
+def merge(defaults: Mapping[str, Any], design: Mapping[str, Any]) -> dict[str, Any]:
+    # Device tables are merged key by key, everything else is replaced
+    result = dict(defaults)
+    for name, value in design.items():
+        if isinstance(value, Mapping) and isinstance(result.get(name), Mapping):
+            result[name] = {**result[name], **value}
+        else:
+            result[name] = value
+    return result
+
+def load_specs(path: str) -> list[dict[str, Any]]:
+    ext = os.path.splitext(path)[1].lower()
+    match ext:
+        case ".json":
+            with open(path) as f:
+                data = json.load(f)
+        case ".toml":
+            import tomllib
+            with open(path, "rb") as f:
+                data = tomllib.load(f)
+        case _:
+            raise ValueError("Unknown spec format: {}".format(path))
+    if isinstance(data, list):
+        data = {"design": data}
+    defaults = data.get("defaults", {})
+    specs = []
+    for i, design in enumerate(data.get("design", [])):
+        spec = merge(defaults, design)
+        spec.setdefault("name", "design{}".format(i))
+        specs.append(spec)
+    return specs
+
+def topology(spec: Mapping[str, Any]) -> Any:
+    name = spec.get("topology", "")
+    if name not in TOPOLOGIES:
+        raise ValueError("Unknown topology: {} (one of {})".format(name, ", ".join(TOPOLOGIES)))
+    return TOPOLOGIES[name]
+
+def models(spec: Mapping[str, Any]) -> list[str]:
+    return [spec[dev]["model"] for dev in topology(spec).DEVICES
+            if isinstance(spec.get(dev), Mapping) and "model" in spec[dev]]
+
+def fields(name: str) -> list[str]:
+    # Record fields of a topology, in output order
+    cls = TOPOLOGIES[name]
+    return METRICS + [s for s in cls.STATE if s not in METRICS] + ["{}_width".format(dev) for dev in cls.DEVICES]
+
+def build(spec: Mapping[str, Any]) -> Any:
+    cls = topology(spec)
+    design = cls()
+    for name, value in spec.items():
+        if name in ("name", "topology"):
+            continue
+        if name in cls.DEVICES:
+            if not isinstance(value, Mapping):
+                raise ValueError("Device {} must be a table of inputs".format(name))
+            if value.get("model", "") not in MODELLIST:
+                raise ValueError("Unknown model for {}: {}".format(name, value.get("model", "")))
+            getattr(design, name).configure(**value)
+        elif name in vars(design) and name not in ("utils", "bank", "graph") and not name.startswith("_"):
+            setattr(design, name, value)
+        else:
+            raise ValueError("Unknown {} parameter: {}".format(spec["topology"], name))
+    return design
+
+# Modules whose code the records depend on, besides the topology's own
+CODE = ["spec", "transistor", "devicebank", "utils", "sweep", "stability", "freqresp", "_graph",
+        "_datahandler", "_modeltable", "_interp"]
+
+# Code digests by topology, the code does not change while it runs
+_code: dict[str, list[str]] = {}
+
+def code_digest(cls: Any) -> list[str]:
+    if cls.__name__ not in _code:
+        _code[cls.__name__] = [results.digest(str(sys.modules[name].__file__)) for name in [cls.__module__] + CODE]
+    return _code[cls.__name__]
+
+def cache_key(spec: Mapping[str, Any]) -> Optional[str]:
+    # None for specs that do not build, they are not cached
+    try:
+        cls = topology(spec)
+        used = models(spec)
+    except ValueError:
+        return None
+    if any(model not in MODELLIST for model in used):
+        return None
+    files: dict[str, list[str]] = {}
+    for model in sorted(set(used)):
+        base = model_base(model)
+        files[model] = [results.digest(base + ext) for ext in (".pkl", ".npy", ".json") if os.path.exists(base + ext)]
+    return results.key({"topology": cls.__name__,
+                        "spec":     {name: value for name, value in spec.items() if name != "name"},
+                        "models":   files,
+                        "dtype":    _datahandler.DTYPE,
+                        "code":     code_digest(cls)})
+
+def current(design: Any) -> bool:
+    # The models a design was evaluated with are still the files on disk
+    return all(reader.stamp == model_stamp(reader.base) for reader in design.bank.readers.values())
+
+def number(value: Any) -> Optional[float]:
+    # Non-finite results are written as null
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+def evaluate(spec: Mapping[str, Any], cache: bool = True) -> dict[str, Any]:
+    # One output record per spec. A spec that fails to build or evaluate
+    # gives a record with the error instead of aborting the batch.
+    key = cache_key(spec) if cache and results.enabled else None
+    if key is not None:
+        cached = results.get(key)
+        if cached is not None:
+            cached["name"] = spec.get("name", "")
+            return cached
+    record: dict[str, Any] = {"name": spec.get("name", ""), "topology": spec.get("topology", ""), "error": None}
+    try:
+        design = build(spec)
+        with np.errstate(all="ignore"):
+            design.init()
+            av = design.av()
+            values = {"av":     av,
+                      "av_db":  20 * np.log10(np.abs(av)),
+                      "rout":   design.rout(),
+                      "power":  design.power(),
+                      "area":   design.area(),
+                      **design.stability()}
+        for name in design.STATE:
+            values.setdefault(name, getattr(design, name))
+        for dev in design.DEVICES:
+            device = getattr(design, dev)
+            values["{}_width".format(dev)] = device.w_val if device.model != "" else np.nan
+        for name in fields(record["topology"]):
+            record[name] = number(values[name])
+    except Exception as e:
+        record["error"] = "{}: {}".format(type(e).__name__, e)
+    # Only stored if the model files did not change while evaluating, so
+    # the record matches the files hashed into the key
+    if key is not None and record["error"] is None and current(design) and cache_key(spec) == key:
+        results.put(key, record)
+    return record
@@ -0,0 +1,63 @@
+import numpy as np
+import numpy.typing as npt
+from typing import Any
+import freqresp
+from freqresp import as_poles
+
+# Headless stability metrics computed straight from the pole list, for one
+# design or for arrays of designs, with the all-pole transfer functions of
+# freqresp.py. Here each design is evaluated at its own frequency.
+#
+# The gain crossing of a level is found by Newton's method on ln|H| versus
+# ln f. ln|H| is concave and decreasing in ln f, so starting above the
+# crossing the iteration converges monotonically.
+
+ITERATIONS = 50
+
+def magnitude(poles: npt.ArrayLike, gain: npt.ArrayLike, f: npt.ArrayLike) -> npt.NDArray[np.float64]:
+    result: npt.NDArray[np.float64] = np.asarray(gain) * np.exp(freqresp.log_magnitude(as_poles(poles), np.asarray(f, dtype=np.float64)))
+    return result
+
+def phase(poles: npt.ArrayLike, f: npt.ArrayLike) -> npt.NDArray[np.float64]:
+    # Degrees, unwrapped
+    return freqresp.phase(as_poles(poles), np.asarray(f, dtype=np.float64))
+
+def crossing(poles: npt.ArrayLike, gain: npt.ArrayLike, level: npt.ArrayLike) -> npt.NDArray[np.float64]:
+    # Frequency where |H| falls to level, NaN if the gain never reaches it
+    p = as_poles(poles)
+    gain = np.broadcast_to(np.asarray(gain, dtype=np.float64), p.shape[:-1])
+    level = np.broadcast_to(np.asarray(level, dtype=np.float64), p.shape[:-1])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        target = np.log(gain / level)
+        # Above the crossing: a single pole at the highest pole frequency
+        # would already be down to the level there
+        x = np.log(gain / level * np.nanmax(p, axis=-1))
+        logp = np.log(p)
+        for _ in range(ITERATIONS):
+            u = np.exp(2 * (x[..., None] - logp))
+            g = target - 0.5 * np.nansum(np.log1p(u), axis=-1)
+            dg = -np.nansum(u / (1 + u), axis=-1)
+            step = g / dg
+            x = x - step
+            if not np.any(np.abs(step) > 1e-12):
+                break
+        return np.where(target > 0, np.exp(x), np.nan)
+
+def metrics(poles: npt.ArrayLike, gain: npt.ArrayLike, cl_gain: npt.ArrayLike = 0.0) -> dict[str, npt.NDArray[np.float64]]:
+    # Unity-gain frequency, gain-bandwidth product (gain times dominant
+    # pole) and phase margin where the gain falls to cl_gain [dB]
+    p = as_poles(poles)
+    gain = np.asarray(gain, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fc = crossing(p, gain, 10 ** (np.asarray(cl_gain, dtype=np.float64) / 20))
+        return {"ugf":          crossing(p, gain, 1.0),
+                "gbw":          gain * np.nanmin(p, axis=-1),
+                "phase_margin": 180 + phase(p, fc)}
+
+POLE_FIELDS = ("fp1", "fp2", "fp3", "fp4")
+
+def from_results(res: npt.NDArray[Any], cl_gain: npt.ArrayLike = 0.0) -> dict[str, npt.NDArray[np.float64]]:
+    # Metrics of sweep results (see sweep.py)
+    names = res.dtype.names or ()
+    poles = np.stack([res[f] for f in POLE_FIELDS if f in names], axis=-1)
+    return metrics(poles, res["av"], cl_gain)
@@ -0,0 +1,144 @@
+import itertools
+import numpy as np
+import numpy.typing as npt
+from typing import Any, Mapping
+from _instrument import timed
+
+# Vectorized design-space sweeps. A Sweep evaluates many designs of one
+# topology at once: every swept parameter is an array, device operating points
+# are resolved with one batched lookup per device, and the topology equations
+# run as NumPy broadcasts over all design points.
+#
+# Parameters are named after the topology attributes ("itail", "Cc", ...) and
+# "<device>_<input>" for device inputs ("M0_gmoverid", "M3_gateL"). Anything
+# not swept is taken from the template topology the sweep is built from.
+
+class DeviceArrays:
+    # Array counterpart of the MosDevice metric accessors, so the topology
+    # equations run unchanged on a batch of designs
+    def __init__(self, res: dict[str, npt.NDArray[np.float64]]) -> None:
+        self.res = res
+
+    def gmro(self) -> npt.NDArray[np.float64]:
+        return self.res["gmro"]
+
+    def ft(self) -> npt.NDArray[np.float64]:
+        return self.res["ft"]
+
+    def gm(self) -> npt.NDArray[np.float64]:
+        return self.res["gm"]
+
+    def ro(self) -> npt.NDArray[np.float64]:
+        return self.res["ro"]
+
+    def cgg(self) -> npt.NDArray[np.float64]:
+        return self.res["cgg"]
+
+    def cgs(self) -> npt.NDArray[np.float64]:
+        return self.res["cgg"] * 0.5
+
+    def width(self) -> npt.NDArray[np.float64]:
+        return self.res["width"]
+
+class Sweep:
+    # Set by each topology's sweep
+    TOPOLOGY: Any       = None  # class with currents() and equations()
+    SCALARS: list[str]  = []    # swept topology attributes
+    FLAGS: list[str]    = []    # boolean topology attributes
+    DEVICES: list[str]  = []    # device attribute names
+    OUTPUTS: list[str]  = []    # results of the topology equations
+    INPUTS: list[str]   = ["gmoverid", "gateL"]
+
+    def __init__(self, template: Any) -> None:
+        self.template = template
+
+    def parameters(self) -> list[str]:
+        return self.SCALARS + self.FLAGS + ["{}_{}".format(dev, ax) for dev in self.DEVICES for ax in self.INPUTS]
+
+    def size(self, **axes: npt.ArrayLike) -> int:
+        return int(np.prod([np.size(a) for a in axes.values()], dtype=np.int64))
+
+    def grid(self, **axes: npt.ArrayLike) -> npt.NDArray[Any]:
+        # Every combination of the given axes, shaped like the grid
+        shape = [np.size(a) for a in axes.values()]
+        return self.chunk(0, self.size(**axes), **axes).reshape(shape)
+
+    def chunk(self, start: int, stop: int, **axes: npt.ArrayLike) -> npt.NDArray[Any]:
+        # Designs start..stop of the grid spanned by the axes. Only the axes
+        # are needed to describe a chunk, which keeps parallel sweeps cheap.
+        values = [np.ravel(np.asarray(a)) for a in axes.values()]
+        idx = np.unravel_index(np.arange(start, stop), [len(v) for v in values])
+        return self.evaluate(**{name: v[i] for name, v, i in zip(axes.keys(), values, idx)})
+
+    @timed()
+    def evaluate(self, **params: npt.ArrayLike) -> npt.NDArray[Any]:
+        # Designs given point by point; arrays broadcast against each other
+        unknown = set(params) - set(self.parameters())
+        if unknown:
+            raise ValueError("Unknown sweep parameters: {}".format(", ".join(sorted(unknown))))
+        arrays = np.broadcast_arrays(*[np.asarray(v) for v in params.values()])
+        shape = arrays[0].shape if arrays else ()
+        p: dict[str, Any] = {name: np.ravel(a) for name, a in zip(params.keys(), arrays)}
+        for name in self.parameters():
+            if name not in p:
+                p[name] = np.full(int(np.prod(shape)), self.__default(name))
+
+        result = np.empty(int(np.prod(shape)), dtype=self.dtype())
+        for field in self.parameters():
+            result[field] = p[field]
+
+        # Flags change the circuit, so each combination is evaluated separately
+        flag_values = [np.unique(p[flag]) for flag in self.FLAGS]
+        for combo in itertools.product(*flag_values):
+            mask = np.ones(len(result), dtype=bool)
+            for flag, value in zip(self.FLAGS, combo):
+                mask &= p[flag] == value
+            sub = {name: value[mask] for name, value in p.items()}
+            sub.update(zip(self.FLAGS, (bool(v) for v in combo)))
+            self.__evaluate(sub, result, mask)
+        return result.reshape(shape)
+
+    def dtype(self) -> np.dtype[Any]:
+        fields: list[tuple[str, Any]] = [(name, np.float64) for name in self.SCALARS]
+        fields += [(name, np.bool_) for name in self.FLAGS]
+        fields += [("{}_{}".format(dev, ax), np.float64) for dev in self.DEVICES for ax in self.INPUTS]
+        fields += [(name, np.float64) for name in self.OUTPUTS]
+        fields += [("{}_width".format(dev), np.float64) for dev in self.DEVICES]
+        fields += [("area", np.float64)]
+        return np.dtype(fields)
+
+    def currents(self, p: Mapping[str, Any]) -> dict[str, Any]:
+        result: dict[str, Any] = self.TOPOLOGY.currents(p)
+        return result
+
+    def equations(self, p: Mapping[str, Any], M: Mapping[str, Any]) -> dict[str, Any]:
+        result: dict[str, Any] = self.TOPOLOGY.equations(p, M)
+        return result
+
+    def __default(self, name: str) -> Any:
+        if name in self.SCALARS or name in self.FLAGS:
+            return getattr(self.template, name)
+        dev, ax = name.split("_", 1)
+        return getattr(getattr(self.template, dev), ax)
+
+    def __evaluate(self, p: dict[str, Any], result: npt.NDArray[Any], mask: npt.NDArray[np.bool_]) -> None:
+        n = int(mask.sum())
+        M: dict[str, Any] = {}
+        for name, id in self.currents(p).items():
+            dev = getattr(self.template, name)
+            if dev.model == "":
+                continue
+            M[name] = DeviceArrays(dev.lookup(p[name + "_gmoverid"], np.broadcast_to(id, n), p[name + "_gateL"]))
+
+        out = self.equations(p, M)
+        for name in self.OUTPUTS:
+            result[name][mask] = np.broadcast_to(out.get(name, np.nan), n)
+        area = np.zeros(n)
+        for dev in self.DEVICES:
+            if dev in M:
+                width = np.abs(M[dev].width())
+                area += width * p[dev + "_gateL"]
+                result[dev + "_width"][mask] = width
+            else:
+                result[dev + "_width"][mask] = np.nan
+        result["area"][mask] = area
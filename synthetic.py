@@ -0,0 +1,187 @@
+import argparse
+import os
+import numpy as np
+import numpy.typing as npt
+from typing import Any, Optional
+from _datahandler import MODELDIR, MODELLIST
+from _modeltable import ModelTable, fmt
+
+# Synthetic device models for machines without the PDK-derived simulation
+# files. Every model is an EKV long-channel transistor, W = 1 um, with
+# channel-length modulation, DIBL and overlap capacitance, swept over the
+# gate voltage for a grid of vds (vsd for PMOS) and L. Models are written
+# either as the pickled DataFrame the simulator export produces, with
+# columns named like
+#   M0:gm (vds=3.00e-01,length=1.00e-06) X/Y
+# or directly in the tensor format of convert_models.py, which streams to
+# disk one vds at a time and scales to multi-GB grids.
+#
+#   python synthetic.py --size small                  # all eight models
+#   python synthetic.py --size large --format npy     # ~1 GB per model
+
+PARAMS = ["gmoverid", "gm", "gds", "id", "cgg", "cgs", "cgd", "gmbs", "vth", "vdsat", "fug", "self_gain"]
+
+# Thermal voltage
+UT = 0.0259
+# Oxide capacitance [F/m^2] of the core and the 2.5 V thick-oxide devices
+COX    = 8e-3
+COX_25 = 5e-3
+
+# Threshold, mobility times Cox [A/V^2], slope factor, channel-length
+# modulation [1/V at 1 um], DIBL, Cox and overlap capacitance per width [F/m]
+DEVICES = {"nch":       {"pmos": False, "vth": 0.45, "kp": 300e-6, "n": 1.30, "clm": 0.08, "dibl": 0.020, "cox": COX,    "cov": 0.30e-9},
+           "nch_lvt":   {"pmos": False, "vth": 0.35, "kp": 320e-6, "n": 1.28, "clm": 0.09, "dibl": 0.025, "cox": COX,    "cov": 0.30e-9},
+           "nch_hvt":   {"pmos": False, "vth": 0.55, "kp": 280e-6, "n": 1.32, "clm": 0.07, "dibl": 0.015, "cox": COX,    "cov": 0.30e-9},
+           "nch_25":    {"pmos": False, "vth": 0.60, "kp": 200e-6, "n": 1.40, "clm": 0.05, "dibl": 0.010, "cox": COX_25, "cov": 0.35e-9},
+           "pch":       {"pmos": True,  "vth": 0.45, "kp": 100e-6, "n": 1.35, "clm": 0.10, "dibl": 0.020, "cox": COX,    "cov": 0.30e-9},
+           "pch_lvt":   {"pmos": True,  "vth": 0.35, "kp": 110e-6, "n": 1.33, "clm": 0.11, "dibl": 0.025, "cox": COX,    "cov": 0.30e-9},
+           "pch_hvt":   {"pmos": True,  "vth": 0.55, "kp":  90e-6, "n": 1.37, "clm": 0.09, "dibl": 0.015, "cox": COX,    "cov": 0.30e-9},
+           "pch_25":    {"pmos": True,  "vth": 0.60, "kp":  70e-6, "n": 1.45, "clm": 0.06, "dibl": 0.010, "cox": COX_25, "cov": 0.35e-9}}
+
+# Grid points (vds, L, gate voltage) of the size presets and the resulting
+# size per model
+SIZES = {"tiny":    (4, 4, 50),         # 77 kB
+         "small":   (12, 8, 241),       # 2 MB
+         "medium":  (24, 32, 1000),     # 74 MB
+         "large":   (48, 64, 4000),     # 1.2 GB
+         "huge":    (96, 128, 8000)}    # 9.4 GB
+
+WIDTH = 1e-6
+# L of the 1-2-5 series, always on the grid so typical designs need no
+# interpolation in L
+SERIES = [1e-7, 2e-7, 5e-7, 1e-6, 2e-6, 5e-6, 1e-5, 2e-5]
+
+def axes(n_vds: int, n_len: int, n_points: int) -> tuple[list[float], list[float], npt.NDArray[np.float64]]:
+    vds = [float(v) for v in np.linspace(0.1, 1.2, n_vds)]
+    if n_len <= len(SERIES):
+        lengths = [SERIES[i] for i in np.unique(np.round(np.linspace(0, len(SERIES) - 1, n_len)).astype(int))]
+    else:
+        extra = np.geomspace(SERIES[0], SERIES[-1], n_len - len(SERIES) + 2)[1:-1]
+        lengths = sorted(set(SERIES) | {float(L) for L in extra})
+    # Rounded like the column names, so both formats have identical axes
+    return [float(fmt(v)) for v in vds], [float(fmt(L)) for L in lengths], np.linspace(0.0, 1.2, n_points)
+
+def softplus(x: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    result: npt.NDArray[np.float64] = np.logaddexp(0, x)
+    return result
+
+def sigmoid(x: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    result: npt.NDArray[np.float64] = 0.5 * (1 + np.tanh(x / 2))
+    return result
+
+def evaluate(model: str, vds: npt.ArrayLike, L: npt.ArrayLike, vgs: npt.ArrayLike) -> dict[str, npt.NDArray[np.float64]]:
+    # All PARAMS, broadcast over vds, L and vgs (magnitudes for PMOS)
+    d = DEVICES[model]
+    vds = np.asarray(vds, dtype=np.float64)
+    L = np.asarray(L, dtype=np.float64)
+    vgs = np.asarray(vgs, dtype=np.float64)
+    n = d["n"]
+
+    vth = d["vth"] - d["dibl"] * vds
+    vp = (vgs - vth) / n
+    xf = vp / (2 * UT)
+    xr = (vp - vds) / (2 * UT)
+    # Forward and reverse inversion coefficients
+    icf = softplus(xf) ** 2
+    icr = softplus(xr) ** 2
+    ispec = 2 * n * d["kp"] * UT ** 2 * WIDTH / L
+    clm = 1 + d["clm"] * (1e-6 / L) * vds
+    id = ispec * (icf - icr) * clm
+
+    dicf = softplus(xf) * sigmoid(xf) / UT
+    dicr = softplus(xr) * sigmoid(xr) / UT
+    gm = ispec * (dicf - dicr) / n * clm
+    gds = ispec * dicr * clm + ispec * (icf - icr) * d["clm"] * (1e-6 / L) + d["dibl"] * gm
+
+    # Intrinsic gate capacitance rises from depletion to 2/3 Cox WL in strong
+    # inversion, plus overlap on both sides
+    cox = d["cox"] * WIDTH * L
+    inv = icf / (1 + icf)
+    cgs = cox * (0.2 * (1 - inv) + (2 / 3) * inv) + d["cov"] * WIDTH
+    cgd = d["cov"] * WIDTH
+    cgg = cgs + cgd
+
+    values = {"gmoverid":   gm / id,
+              "gm":         gm,
+              "gds":        gds,
+              "id":         id,
+              "cgg":        cgg,
+              "cgs":        cgs,
+              "cgd":        cgd,
+              "gmbs":       (n - 1) * gm,
+              "vth":        vth,
+              "vdsat":      2 * UT * np.sqrt(icf + 0.25) + 3 * UT,
+              "fug":        gm / (2 * np.pi * cgg),
+              "self_gain":  gm / gds}
+    shape = np.broadcast_shapes(vds.shape, L.shape, vgs.shape)
+    return {name: np.broadcast_to(value, shape) for name, value in values.items()}
+
+def write_tensor(base: str, model: str, vds: list[float], lengths: list[float], vgs: npt.NDArray[np.float64]) -> None:
+    # Streams one vds at a time into the memory-mapped .npy file
+    shape = (len(PARAMS), len(vds), len(lengths), len(vgs))
+    data = np.lib.format.open_memmap(base + ".npy", mode="w+", dtype=np.float64, shape=shape)
+    L = np.asarray(lengths)[:, None]
+    for v, vd in enumerate(vds):
+        values = evaluate(model, vd, L, vgs)
+        for p, param in enumerate(PARAMS):
+            data[p, v] = values[param]
+    data.flush()
+    del data
+    ModelTable(np.empty((0, 0, 0, 0)), PARAMS, vds, lengths).save_axes(base)
+
+def dataframe(model: str, vds: list[float], lengths: list[float], vgs: npt.NDArray[np.float64]) -> Any:
+    # The simulator export: an X (gate voltage) and Y column per parameter,
+    # vds and L
+    import pandas as pd
+    vkey = "vsd" if DEVICES[model]["pmos"] else "vds"
+    names = []
+    columns = []
+    for vd in vds:
+        values = evaluate(model, vd, np.asarray(lengths)[:, None], vgs)
+        for param in PARAMS:
+            for l, L in enumerate(lengths):
+                name = "M0:{} ({}={},length={})".format(param, vkey, fmt(vd), fmt(L))
+                names += [name + " X", name + " Y"]
+                columns += [vgs, values[param][l]]
+    return pd.DataFrame(np.column_stack(columns), columns=names)
+
+def write_models(directory: str, n_vds: int, n_len: int, n_points: int, format: str = "npy",
+                 models: Optional[list[str]] = None) -> None:
+    # format is "npy", "pkl" or "both"
+    os.makedirs(directory, exist_ok=True)
+    vds, lengths, vgs = axes(n_vds, n_len, n_points)
+    for model in models or list(MODELLIST):
+        base = os.path.join(directory, MODELLIST[model])
+        if format in ("pkl", "both"):
+            dataframe(model, vds, lengths, vgs).to_pickle(base + ".pkl")
+        if format in ("npy", "both"):
+            # Written after the pickle, so the tensor counts as current
+            write_tensor(base, model, vds, lengths, vgs)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Write synthetic device models")
+    parser.add_argument("--dir", default=MODELDIR, help="Output directory")
+    parser.add_argument("--size", choices=list(SIZES), default="small", help="Grid preset")
+    parser.add_argument("--vds", type=int, default=0, help="vds points, overrides the preset")
+    parser.add_argument("--lengths", type=int, default=0, help="L points, overrides the preset")
+    parser.add_argument("--points", type=int, default=0, help="Gate voltage points, overrides the preset")
+    parser.add_argument("--format", choices=["npy", "pkl", "both"], default="both")
+    parser.add_argument("models", nargs="*", help="Models to write, default all")
+    args = parser.parse_args()
+    for model in args.models:
+        if model not in MODELLIST:
+            parser.error("Unknown model {}, choose from {}".format(model, ", ".join(MODELLIST)))
+
+    n_vds, n_len, n_points = SIZES[args.size]
+    n_vds = args.vds or n_vds
+    n_len = args.lengths or n_len
+    n_points = args.points or n_points
+    vds, lengths, vgs = axes(n_vds, n_len, n_points)
+    models = args.models or list(MODELLIST)
+    size = len(PARAMS) * len(vds) * len(lengths) * len(vgs) * 8
+    print("Writing {} models, {} vds x {} L x {} points, {:.1f} MB each".format(
+          len(models), len(vds), len(lengths), len(vgs), size / 1e6))
+    write_models(args.dir, n_vds, n_len, n_points, args.format, models)
+
+if __name__ == "__main__":
+    main()
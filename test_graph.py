@@ -0,0 +1,142 @@
+import copy
+import os
+import pickle
+import tempfile
+import unittest
+import numpy as np
+from typing import Any
+import _datahandler
+import spec
+from synthetic import SIZES, write_models
+
+# Regression tests of the incremental recompute (see _graph.py). A design
+# updated by init() after each partial change must equal a fresh design with
+# the same changes, evaluated in full. Runs on small synthetic models.
+#
+#   python -m unittest test_graph
+
+DESIGNS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "designs.toml")
+
+Change = tuple[str, Any]
+
+def apply(design: Any, changes: list[Change]) -> None:
+    # Changes are "name" (topology attribute) or "device.input"
+    for name, value in changes:
+        if "." in name:
+            dev, name = name.split(".")
+            setattr(getattr(design, dev), name, value)
+        else:
+            setattr(design, name, value)
+
+def devices(design: Any) -> dict[str, Any]:
+    return {name: getattr(design, name) for name in design.DEVICES}
+
+class GraphUpdateTest(unittest.TestCase):
+    # Design specs by name, the synthetic models and the model directory
+    # restored afterwards
+    specs: dict[str, dict[str, Any]]
+    tmp: tempfile.TemporaryDirectory[str]
+    modeldir: str
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.specs = {s["name"]: s for s in spec.load_specs(DESIGNS)}
+        cls.tmp = tempfile.TemporaryDirectory()
+        models = sorted({model for s in cls.specs.values() for model in spec.models(s)})
+        write_models(cls.tmp.name, *SIZES["small"], "npy", models)
+        cls.modeldir = _datahandler.MODELDIR
+        _datahandler.MODELDIR = cls.tmp.name
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        _datahandler.MODELDIR = cls.modeldir
+        cls.tmp.cleanup()
+
+    def fresh(self, name: str, changes: list[Change]) -> Any:
+        design = spec.build(self.specs[name])
+        apply(design, changes)
+        design.init()
+        return design
+
+    def assertSameDesign(self, design: Any, expected: Any) -> None:
+        # Nodes kept by update() against a full evaluate(), and the state
+        full = expected.equations(vars(expected), devices(expected))
+        nodes = {name: value for name, (value, _) in design.graph.entries.items() if value is not None}
+        self.assertEqual(sorted(nodes), sorted(full))
+        for name, value in full.items():
+            np.testing.assert_array_equal(nodes[name], value, err_msg=name)
+        for name in design.STATE:
+            if name in full:
+                np.testing.assert_array_equal(getattr(design, name), getattr(expected, name), err_msg=name)
+
+    def check(self, name: str, changes: list[Change]) -> Any:
+        # Applies the changes one at a time to one design
+        design = self.fresh(name, [])
+        for i, change in enumerate(changes):
+            apply(design, [change])
+            design.init()
+            with self.subTest(design=name, change=change[0]):
+                self.assertSameDesign(design, self.fresh(name, changes[:i + 1]))
+        return design
+
+    def test_unchanged(self) -> None:
+        design = self.fresh("twostage_lp", [])
+        design.init()
+        self.assertEqual(design.graph.recomputed, [])
+
+    def test_twostage(self) -> None:
+        self.check("twostage_lp", [("Cc", 200e-15), ("M3.gmoverid", 15.0), ("iout", 2e-6),
+                                   ("cascode_input", False), ("M5.gmoverid", 10.0), ("cascode_input", True),
+                                   ("cascode_mirror", False)])
+
+    def test_unused_device(self) -> None:
+        # M5 is only read with cascode_input
+        design = self.fresh("twostage_lp", [("cascode_input", False)])
+        design.M5.gmoverid = 10.0
+        design.init()
+        self.assertEqual(design.graph.recomputed, [])
+
+    def test_folded_cascode(self) -> None:
+        self.check("foldedcascode", [("twostage", False), ("Cc", 1e-12), ("M0.gmoverid", 15.0),
+                                     ("twostage", True), ("iout", 12e-6)])
+
+    def test_ota(self) -> None:
+        self.check("ota", [("itail", 5e-6), ("M3.gmoverid", 15.0), ("M0.gateL", 2e-6), ("CL", 1e-12)])
+
+    def test_pickle(self) -> None:
+        design = self.check("twostage_lp", [("Cc", 200e-15)])
+        copied = pickle.loads(pickle.dumps(design))
+        copied.init()
+        self.assertEqual(copied.graph.recomputed, [])
+        apply(copied, [("M3.gmoverid", 15.0)])
+        copied.init()
+        self.assertSameDesign(copied, self.fresh("twostage_lp", [("Cc", 200e-15), ("M3.gmoverid", 15.0)]))
+
+    def test_deepcopy(self) -> None:
+        design = self.check("twostage_lp", [("Cc", 200e-15)])
+        copied = copy.deepcopy(design)
+        apply(copied, [("M0.gmoverid", 20.0), ("iout", 2e-6)])
+        copied.init()
+        self.assertSameDesign(copied, self.fresh("twostage_lp", [("Cc", 200e-15), ("M0.gmoverid", 20.0), ("iout", 2e-6)]))
+        # The original keeps its own devices and nodes
+        design.init()
+        self.assertEqual(design.graph.recomputed, [])
+        self.assertSameDesign(design, self.fresh("twostage_lp", [("Cc", 200e-15)]))
+
+    def test_model_rewrite(self) -> None:
+        # A model rewritten in place is looked up again for every device
+        # using it once anything changes, like in a fresh design
+        with tempfile.TemporaryDirectory() as tmp:
+            _datahandler.MODELDIR = tmp
+            try:
+                write_models(tmp, *SIZES["small"], "npy", ["nch_25", "pch_25"])
+                design = self.fresh("ota", [])
+                write_models(tmp, 6, 5, 120, "npy", ["nch_25", "pch_25"])
+                apply(design, [("M3.gmoverid", 15.0)])
+                design.init()
+                self.assertSameDesign(design, self.fresh("ota", [("M3.gmoverid", 15.0)]))
+            finally:
+                _datahandler.MODELDIR = self.tmp.name
+
+if __name__ == "__main__":
+    unittest.main()
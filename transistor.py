@@ -1,74 +1,171 @@
 import numpy.typing as npt
 import numpy as np
-from _datahandler import DataHandler
+from contextlib import contextmanager
+from typing import Any, Callable, Generic, Iterator, Optional, TypeVar, overload
+from devicebank import DeviceBank, lookup_lengths
+from _instrument import timed
+
+# Inputs of a MosDevice. Assigning any of them (directly or through the
+# set_* methods) marks the device dirty, and the operating point is looked up
+# again the first time a metric is read.
+INPUTS = ("model", "gmoverid", "id", "gateL", "vdsrc", "interpolate")
+
+T = TypeVar("T")
+
+class Field(Generic[T]):
+    # An input stored in the device's row of the bank, read as kind
+    def __init__(self, name: str, kind: Callable[[Any], T]) -> None:
+        self.name = name
+        self.kind = kind
+
+    @overload
+    def __get__(self, device: None, owner: type) -> "Field[T]": ...
+    @overload
+    def __get__(self, device: "MosDevice", owner: type) -> T: ...
+    def __get__(self, device: Optional["MosDevice"], owner: type) -> "Field[T] | T":
+        if device is None:
+            return self
+        if self.name == "model":
+            return self.kind(device.bank.models[device.bank.model[device.row]])
+        return self.kind(getattr(device.bank, self.name)[device.row])
+
+    def __set__(self, device: "MosDevice", value: T) -> None:
+        device.bank.set(device.row, self.name, value)
+
+def field(name: str, kind: Callable[[Any], T]) -> Field[T]:
+    return Field(name, kind)
 
 class MosDevice():
-    def __init__(self) -> None:
-        self.__reader = DataHandler()
-        self.model: str             = ""
-        self.gmoverid: float        = 0.0
-        self.id: float              = 0.0
-        self.gateL: float           = 0.0
-        self.vdsrc: float           = 0.0
-        
-        self.gmro_val: float        = 0.0
-        self.ft_val: float          = 0.0
-        self.gmoverid_val: float    = 0.0
-        self.idw_val: float         = 0.0
-        self.w_val: float           = 0.0
-        self.__gmoverid_arr: npt.NDArray[np.float64]
-        self.__gmro_arr: npt.NDArray[np.float64]
-        self.__ft_arr: npt.NDArray[np.float64]
-        self.__idw_arr: npt.NDArray[np.float64]
+    # A view of one row of a DeviceBank (see devicebank.py). Devices of one
+    # topology share a bank, a device created on its own gets a bank of its
+    # own.
+    __slots__ = ("bank", "row")
+    
+    model       = field("model", str)
+    gmoverid    = field("gmoverid", float)
+    id          = field("id", float)
+    gateL       = field("gateL", float)
+    vdsrc       = field("vdsrc", float)
+    # Interpolate between grid points instead of snapping to the nearest
+    # one. Off-grid gateL/vdsrc are always interpolated.
+    interpolate = field("interpolate", bool)
+    
+    def __init__(self, bank: Optional[DeviceBank] = None) -> None:
+        self.bank: DeviceBank   = DeviceBank() if bank is None else bank
+        self.row: int           = self.bank.add()
         
     def set_gmoverid(self, gmid: float) -> None:
         self.gmoverid = gmid
-        if self.valid():
-            self.__calculate()
         
     def set_id(self, id: float) -> None:
         self.id = id
-        if self.valid():
-            self.__calculate()
         
     def set_model(self, model: str) -> None:
         self.model = model
-        if self.valid():
-            self.__calculate()
             
     def set_gateL(self, gateL: float) -> None:
         self.gateL = gateL
-        if self.valid():
-            self.__calculate()
             
     def set_vdsrc(self, vdsrc: float) -> None:
         self.vdsrc = vdsrc
-        if self.valid():
-            self.__calculate()
         
-    def valid(self) -> bool:
-        if self.model != "" and self.gmoverid != 0.0 and self.id != 0.0 and self.gateL != 0.0 and self.vdsrc != 0.0:
-            return True
-        return False
-    
-    def __find_nearest(self, array: npt.NDArray[np.float64], value: float) -> int:
-        array   = np.asarray(array)
-        idx     = int((np.abs(array - value)).argmin())
-        return idx
-    
-    def __calculate(self) -> None:
-        self.__reader.load(self.model)
-        self.__gmoverid_arr = self.__reader.get_axis("gmoverid", str(self.vdsrc), str(self.gateL))
-        self.__gmro_arr = self.__reader.get_axis("gmro", str(self.vdsrc), str(self.gateL))
-        self.__ft_arr = self.__reader.get_axis("ft", str(self.vdsrc), str(self.gateL))
-        self.__idw_arr = self.__reader.get_axis("id/w", str(self.vdsrc), str(self.gateL))
+    def configure(self, **params: Any) -> "MosDevice":
+        # Applies several inputs at once, followed by a single recalculation
+        for name in params:
+            if name not in INPUTS:
+                raise TypeError("Unknown MosDevice parameter: {}".format(name))
+        with self.batch():
+            for name, value in params.items():
+                setattr(self, name, value)
+        return self
+    
+    @contextmanager
+    def batch(self) -> Iterator["MosDevice"]:
+        # Defers recalculation until the outermost batch exits, even if
+        # metrics are read in between
+        self.bank.deferred[self.row] += 1
+        try:
+            yield self
+        finally:
+            self.bank.deferred[self.row] -= 1
+        self.refresh()
         
-        idx = self.__find_nearest(self.__gmoverid_arr, self.gmoverid)
-        self.gmoverid_val = self.__gmoverid_arr[idx].item()
-        self.gmro_val = self.__gmro_arr[idx].item()
-        self.ft_val = self.__ft_arr[idx].item()
-        self.idw_val = self.__idw_arr[idx].item()
-        self.w_val = self.id / self.idw_val
+    def dirty(self) -> bool:
+        return bool(self.bank.dirty[self.row])
+        
+    def version(self) -> int:
+        # Changes whenever the operating point is resolved again
+        return int(self.bank.version[self.row])
+        
+    def refresh(self) -> None:
+        # Resolves every pending device of the bank along with this one, so
+        # devices of the same model share one batched lookup
+        if self.bank.dirty[self.row]:
+            self.bank.resolve()
+        
+    def valid(self) -> bool:
+        return bool(self.bank.valid(self.row))
+    
+    @timed()
+    def lookup(self, gmoverid: npt.ArrayLike, id: npt.ArrayLike | None = None,
+               gateL: npt.ArrayLike | None = None) -> dict[str, npt.NDArray[np.float64]]:
+        # Batch version of the scalar accessors for the device's model and
+        # vdsrc. id and gateL default to the device's own and broadcast
+        # against gmoverid.
+        gmid, current, length = np.broadcast_arrays(np.asarray(gmoverid, dtype=np.float64),
+                                                    np.asarray(self.id if id is None else id, dtype=np.float64),
+                                                    np.asarray(self.gateL if gateL is None else gateL, dtype=np.float64))
+        reader = self.bank.reader(self.model)
+        vdsrc, interpolate = self.vdsrc, self.interpolate
+        gmids, gmid_inverse = np.unique(gmid, return_inverse=True)
+        lengths, length_inverse = np.unique(length, return_inverse=True)
+        if 2 * len(gmids) * len(lengths) < gmid.size:
+            # Operating points repeat (e.g. grid sweeps), resolve each
+            # distinct (gm/id, L) pair once
+            codes = length_inverse * len(gmids) + gmid_inverse
+            used = np.zeros(len(gmids) * len(lengths), dtype=bool)
+            used[codes] = True
+            pairs = np.flatnonzero(used)
+            slot = np.cumsum(used) - 1
+            points = lookup_lengths(reader, vdsrc, interpolate, gmids[pairs % len(gmids)], lengths[pairs // len(gmids)])
+            inverse = slot[codes].reshape(gmid.shape)
+            gmoverid_val, gmro, ft, idw = (p[inverse] for p in points)
+        else:
+            gmoverid_val, gmro, ft, idw = lookup_lengths(reader, vdsrc, interpolate, gmid, length)
+        gm = gmoverid_val * current
+        return {"gmoverid": gmoverid_val,
+                "gmro":     gmro,
+                "ft":       ft,
+                "idw":      idw,
+                "width":    current / idw,
+                "gm":       gm,
+                "ro":       gmro / gm,
+                "cgg":      gm / ft * (1 / (2 * np.pi))}
+    
+    @property
+    def gmro_val(self) -> float:
+        self.refresh()
+        return float(self.bank.gmro_val[self.row])
+    
+    @property
+    def ft_val(self) -> float:
+        self.refresh()
+        return float(self.bank.ft_val[self.row])
+    
+    @property
+    def gmoverid_val(self) -> float:
+        self.refresh()
+        return float(self.bank.gmoverid_val[self.row])
+    
+    @property
+    def idw_val(self) -> float:
+        self.refresh()
+        return float(self.bank.idw_val[self.row])
+    
+    @property
+    def w_val(self) -> float:
+        self.refresh()
+        return float(self.bank.w_val[self.row])
     
     def gmro(self) -> float:
         return self.gmro_val
@@ -89,4 +186,4 @@ class MosDevice():
         return self.cgg() * 0.5
     
     def width(self) -> float:
-        return self.w_val
\ No newline at end of file
+        return self.w_val
@@ -1,30 +1,43 @@
 import numpy as np
-import scipy as sp
-import matplotlib.pyplot as plt
-from tabulate import tabulate
 from utils import Utils
 from transistor import MosDevice
+from devicebank import DeviceBank
+from sweep import Sweep
+from sensitivity import STEP, Jacobian, jacobian
+import freqresp
+from stability import metrics as stability_metrics
+from typing import Any, Mapping
+from _instrument import timed
+from _graph import Graph, GraphState
+
+utils = Utils()
 
 # Two Stage Amplifier
 # Kenneth Martin p. 243
 
 class TwoStage:
+    DEVICES = ["M0", "M1", "M2", "M3", "M4", "M5"]
+    # Attributes set by __calculate
+    STATE   = ["gm_1st", "rout_1st", "gm_2nd", "rout_2nd", "av_1st", "av_2nd", "fp1", "fp2", "fp3"]
+    
     def __init__(self) -> None:
         self.utils = Utils()
+        # Inputs and operating points of all devices (see devicebank.py)
+        self.bank = DeviceBank()
         # Closed loop gain
         self.cl_gain: float = 0.0
         # Input PMOS
-        self.M0 = MosDevice()
+        self.M0 = MosDevice(self.bank)
         # NMOS Mirror
-        self.M1 = MosDevice()
+        self.M1 = MosDevice(self.bank)
         # NMOS Mirror Cascode
-        self.M2 = MosDevice()
+        self.M2 = MosDevice(self.bank)
         # NMOS 2nd stage
-        self.M3 = MosDevice()
+        self.M3 = MosDevice(self.bank)
         # PMOS 2nd stage load
-        self.M4 = MosDevice()
+        self.M4 = MosDevice(self.bank)
         # Input Cascode
-        self.M5 = MosDevice()
+        self.M5 = MosDevice(self.bank)
         # Miller capacitor
         self.Cc:float           = 0.0
         # Output stage currnet
@@ -55,41 +68,77 @@ class TwoStage:
         self.cascode_mirror: bool = False
         self.cascode_input: bool  = False
         
+        # Derived quantities of the last init()
+        self.graph = GraphState()
+        
+    @timed()
     def init(self) -> None:
-        self.M0.set_id(self.itail/2)
-        self.M1.set_id(self.itail/2)
-        self.M2.set_id(self.itail/2)
-        self.M3.set_id(self.iout)
-        self.M4.set_id(self.iout)
-        self.M5.set_id(self.itail/2)
+        for name, id in self.currents(vars(self)).items():
+            getattr(self, name).set_id(id)
+        # All devices in one go, a batched lookup per model
+        self.bank.resolve()
         
         self.__calculate()
             
+    @timed()
     def __calculate(self) -> None:
-        self.gm_1st = self.M0.gm()
-        self.gm_2nd = self.M3.gm()
+        # Only the quantities whose inputs changed since the last call are
+        # recomputed (see _graph.py)
+        out = GRAPH.update(vars(self), {name: getattr(self, name) for name in self.DEVICES}, self.graph)
+        for name in self.STATE:
+            setattr(self, name, out[name])
         
-        if self.cascode_input:
-            pmos_ro_1st     = self.utils.cascode(self.M1.ro(), self.M5.ro(), self.M5.gm())
-        else:
-            pmos_ro_1st     = self.M0.ro()
-        if self.cascode_mirror:
-            mirror_ro_1st   = self.utils.cascode(self.M1.ro(), self.M2.ro(), self.M2.gm())
-        else:
-            mirror_ro_1st   = self.M1.ro()
-        self.rout_1st   = self.utils.parallel([pmos_ro_1st, mirror_ro_1st])
-        self.av_1st     = self.rout_1st * self.gm_1st
-
-        self.rout_2nd   = self.utils.parallel([self.M3.ro(), self.M4.ro()])
-        self.av_2nd     = self.rout_2nd * self.gm_2nd
+    # The equations below only use arithmetic on the parameters and device
+    # metrics, so they evaluate one design (floats and MosDevices) or a batch
+    # of designs (arrays, see TwoStageSweep) alike
+    @staticmethod
+    def currents(p: Mapping[str, Any]) -> dict[str, Any]:
+        # The cascode devices only carry current when their flag is set
+        currents = {"M0": p["itail"]/2,
+                    "M1": p["itail"]/2,
+                    "M3": p["iout"],
+                    "M4": p["iout"]}
+        if p["cascode_mirror"]:
+            currents["M2"] = p["itail"]/2
+        if p["cascode_input"]:
+            currents["M5"] = p["itail"]/2
+        return currents
+    
+    @staticmethod
+    def equations(p: Mapping[str, Any], M: Mapping[str, Any]) -> dict[str, Any]:
+        return GRAPH.evaluate(p, M)
+    
+    @staticmethod
+    def consumption(p: Mapping[str, Any]) -> Any:
+        return (p["itail"] + p["iout"]) * 1.2 # Assuming 1.2 VDD
+    
+    def sweep(self) -> "TwoStageSweep":
+        # Vectorized evaluation of many designs based on this one
+        return TwoStageSweep(self)
         
-        self.fp1 = (1 / (2 * np.pi * self.Cc * (1 + self.av_2nd) * self.rout_1st))
-        self.fp2 = (self.M3.gm() / (2 * np.pi * (self.CL + self.M3.cgg())))
-        self.fp3 = (self.M1.gm() / (2 * np.pi * 0.5 * self.M1.cgs()))
+    def sensitivity(self, knobs: list[str] | None = None, outputs: list[str] | None = None,
+                    step: float = STEP) -> Jacobian:
+        # Derivatives of the metrics with respect to the sizing knobs, from
+        # one batched evaluation (see sensitivity.py)
+        return jacobian(self, knobs, outputs, step)
         
     def av(self) -> float:
         return self.av_1st * self.av_2nd
     
+    def power(self) -> float:
+        result: float = self.consumption(vars(self))
+        return result
+    
+    def area(self) -> float:
+        # Gate area of all devices in use
+        return self.utils.area([getattr(self, name) for name in self.currents(vars(self))])
+    
+    def stability(self) -> dict[str, float]:
+        # Unity-gain frequency, GBW and phase margin at cl_gain, computed from
+        # the poles without a bode plot
+        res = stability_metrics(self.poles(), self.av(), self.cl_gain)
+        return {name: float(value[0]) for name, value in res.items()}
+    
     def rout(self) -> float:
         return self.rout_2nd
     
@@ -105,12 +154,13 @@ class TwoStage:
         return {"W0": W0, "W1": W1, "W2": W2, "W3": W3, "W4": W4}
     
     def characterize(self, latex: bool) -> None:
+        from tabulate import tabulate
         av1 = np.round(20*np.log10(self.av_1st), 2)
         av2 = np.round(20*np.log10(self.av_2nd), 2)
         av  = np.round(20*np.log10(self.av()), 2)
         poles = self.poles()
         sizes = self.size()
-        power = (self.itail + self.iout) * 1.2 # Assuming 1.2 VDD
+        power = self.power()
         
         poles_formatted = []
         for pole in poles:
@@ -130,35 +180,32 @@ class TwoStage:
         print("Power Consumption: {:.2e} W".format(power))
     
     def bode(self) -> None:
-        poles = self.poles()
-        p1 = poles[0]
-        p2 = poles[1]
-        p3 = poles[2]
-        den3 = [1, p1+p2+p3, p1*p2+p3*p1+p2*p3, p1*p2*p3]
-        K = den3[-1] * self.av()
-        
-        w = np.logspace(0, 8, 1000)
-        sys = sp.signal.TransferFunction([K], den3)
-        w, mag, phase = sp.signal.bode(sys, w)
-
-        fig, ax = plt.subplots()
-        fig.set_size_inches(12, 8)
-
-        ax.set_xlim(1, 1e8)
-        ax.set_xlabel('Frequency [Hz]')
-        ax.set_ylabel('Magnitude [dB]')
-        ax.semilogx(w, mag)
-        
-        ax2 = ax.twinx()
-        ax2.semilogx(w, phase, color="red")
-        ax2.set_ylabel('Phase [deg]')
-        ax.grid()
+        f = freqresp.frequencies(1, 1e8)
+        mag, phase = freqresp.response(self.poles(), self.av(), f)
+        print("Phase Margin: {}".format(self.stability()["phase_margin"]))
+        self.utils.plot_bode(f, mag[0], phase[0], xlim=(1, 1e8))
 
-        for i in range(0, len(mag)):
-            if mag[i] < self.cl_gain:
-                print("Phase Margin: {}".format(180+phase[i]))
-                break
+# Derived quantities of a TwoStage and what they depend on (see _graph.py)
+GRAPH = Graph({"gm_1st":        lambda v: v["M0"].gm(),
+               "gm_2nd":        lambda v: v["M3"].gm(),
+               "pmos_ro_1st":   lambda v: (utils.cascode(v["M1"].ro(), v["M5"].ro(), v["M5"].gm()) if v["cascode_input"]
+                                           else v["M0"].ro()),
+               "mirror_ro_1st": lambda v: (utils.cascode(v["M1"].ro(), v["M2"].ro(), v["M2"].gm()) if v["cascode_mirror"]
+                                           else v["M1"].ro()),
+               "rout_1st":      lambda v: utils.parallel([v["pmos_ro_1st"], v["mirror_ro_1st"]]),
+               "av_1st":        lambda v: v["rout_1st"] * v["gm_1st"],
+               "rout_2nd":      lambda v: utils.parallel([v["M3"].ro(), v["M4"].ro()]),
+               "av_2nd":        lambda v: v["rout_2nd"] * v["gm_2nd"],
+               "fp1":           lambda v: (1 / (2 * np.pi * v["Cc"] * (1 + v["av_2nd"]) * v["rout_1st"])),
+               "fp2":           lambda v: (v["M3"].gm() / (2 * np.pi * (v["CL"] + v["M3"].cgg()))),
+               "fp3":           lambda v: (v["M1"].gm() / (2 * np.pi * 0.5 * v["M1"].cgs())),
+               "av":            lambda v: v["av_1st"] * v["av_2nd"],
+               "rout":          lambda v: v["rout_2nd"],
+               "power":         lambda v: TwoStage.consumption(v)})
 
-        plt.title("Gain (Blue), Phase (Red)")
-        fig.tight_layout()
-        plt.show()
\ No newline at end of file
+class TwoStageSweep(Sweep):
+    TOPOLOGY = TwoStage
+    SCALARS  = ["itail", "iout", "Cc", "CL"]
+    FLAGS    = ["cascode_mirror", "cascode_input"]
+    DEVICES  = TwoStage.DEVICES
+    OUTPUTS  = TwoStage.STATE + ["av", "rout", "power"]
@@ -1,12 +1,20 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import scipy as sp
+from typing import Any, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import scipy as sp
+
+# matplotlib and scipy are only imported when plotting
 
 class Utils:
     def __init__(self) -> None:
         pass
     
-    def parallel(self, res: list[float]) -> float:
+    def parallel(self, res: list[Any]) -> Any:
+        if any(np.ndim(r) for r in res):
+            # Element-wise for arrays, still 0 where any resistance is 0
+            with np.errstate(divide="ignore"):
+                return 1 / sum(1 / np.asarray(r, dtype=np.float64) for r in res)
         parallel_r: float = 0
         for r in res:
             if r == 0:
@@ -14,10 +22,41 @@ class Utils:
             parallel_r += 1/r
         return 1/parallel_r
     
-    def cascode(self, rO1: float, rO2: float, gm2: float) -> float:
+    def cascode(self, rO1: Any, rO2: Any, gm2: Any) -> Any:
         return (1 + gm2 * rO2) * rO1 + rO2
     
-    def bode(self, H: sp.signal.TransferFunction) -> None:
+    def area(self, devices: list[Any]) -> float:
+        # Sum of W*L over the configured devices
+        area: float = 0.0
+        for dev in devices:
+            if dev.model != "":
+                area += abs(dev.width()) * dev.gateL
+        return area
+    
+    def plot_bode(self, f: Any, mag: Any, phase: Any, xlim: Optional[tuple[float, float]] = None) -> None:
+        # Magnitude [dB] and phase [deg] of one design versus frequency [Hz]
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots()
+        fig.set_size_inches(12, 8)
+
+        if xlim is not None:
+            ax.set_xlim(*xlim)
+        ax.set_xlabel('Frequency [Hz]')
+        ax.set_ylabel('Magnitude [dB]')
+        ax.semilogx(f, mag)
+
+        ax2 = ax.twinx()
+        ax2.semilogx(f, phase, color="red")
+        ax2.set_ylabel('Phase [deg]')
+        ax.grid()
+
+        plt.title("Gain (Blue), Phase (Red)")
+        fig.tight_layout()
+        plt.show()
+    
+    def bode(self, H: "sp.signal.TransferFunction") -> None:
+        import matplotlib.pyplot as plt
+        import scipy as sp
         w, mag, phase = sp.signal.bode(H)
         plt.figure()
         plt.subplot(2, 1, 1)